@@ -0,0 +1,152 @@
+"""
+JSON API только для чтения: главная, группы, профили, лента подписок
+и пост с комментариями.
+
+Используются те же запросы и курсорные паджинаторы, что и в HTML-
+страницах, но строки выбираются через values(), без моделей, и
+шаблоны не рендерятся. Ответ сериализуется по одной записи прямо
+в StreamingHttpResponse. Курсоры передаются в параметрах
+'after'/'before', размер страницы - в 'limit' (не больше MAX_LIMIT).
+"""
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .authors import get_author_or_404
+from .feeds import FollowFeedPaginator
+from .models import Comment, Group, Post, User, UserStats
+from .paginators import CommentPaginator, CursorPaginator
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+POST_FIELDS = ('id', 'text', 'pub_date', 'author__username', 'group__slug',
+               'image', 'thumbnails', 'comment_count')
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+RENAMED = {'author__username': 'author', 'group__slug': 'group'}
+IMAGE_FIELDS = ('url', 'srcset', 'width', 'height')
+
+
+def get_limit(request):
+    limit = request.GET.get('limit', '')
+    limit = int(limit) if limit.isdigit() else DEFAULT_LIMIT
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def post_row(row):
+    """Строка values() поста в виде для ответа API."""
+    row = {RENAMED.get(key, key): value for key, value in row.items()}
+    card = (row.pop('thumbnails') or {}).get('card')
+    if card:
+        row['image'] = {field: card[field] for field in IMAGE_FIELDS}
+    elif row['image']:
+        row['image'] = {'url': default_storage.url(row['image'])}
+    else:
+        row['image'] = None
+    return row
+
+
+def comment_row(row):
+    return {RENAMED.get(key, key): value for key, value in row.items()}
+
+
+def stream_json(head, rows, tail):
+    """
+    Отдает объект {**head, "results": [...], **tail()} по частям.
+    tail вызывается после выдачи всех строк.
+    """
+    encode = DjangoJSONEncoder(ensure_ascii=False).encode
+    yield '{'
+    for key, value in head.items():
+        yield f'{encode(key)}: {encode(value)}, '
+    yield '"results": ['
+    for number, row in enumerate(rows):
+        yield (', ' if number else '') + encode(row)
+    yield ']'
+    for key, value in tail().items():
+        yield f', {encode(key)}: {encode(value)}'
+    yield '}'
+
+
+def page_response(page, serialize, **head):
+    return StreamingHttpResponse(
+        stream_json(head, map(serialize, page), lambda: {
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }),
+        content_type='application/json'
+    )
+
+
+def feed_page(request, queryset):
+    return CursorPaginator(
+        queryset.for_feed().values(*POST_FIELDS), get_limit(request)
+    ).get_page(request.GET.get('after'), request.GET.get('before'))
+
+
+def author_info(author):
+    counters = UserStats.for_user(author).as_counters()
+    return {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts': counters['post_count'],
+        'followers': counters['following_count'],
+        'following': counters['follower_count'],
+    }
+
+
+@require_GET
+def index(request):
+    return page_response(feed_page(request, Post.objects.all()), post_row)
+
+
+@require_GET
+def group_posts(request, slug):
+    try:
+        group = Group.objects.values('title', 'slug', 'description').get(
+            slug=slug
+        )
+    except Group.DoesNotExist:
+        raise Http404
+    page = feed_page(request, Post.objects.filter(group__slug=slug))
+    return page_response(page, post_row, group=group)
+
+
+@require_GET
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    page = FollowFeedPaginator(
+        request.user, get_limit(request), fields=POST_FIELDS
+    ).get_page(request.GET.get('after'), request.GET.get('before'))
+    return page_response(page, post_row)
+
+
+@require_GET
+def profile(request, username):
+    try:
+        author = User.objects.select_related('stats').get(
+            pk=get_author_or_404(username).id
+        )
+    except User.DoesNotExist:
+        raise Http404
+    page = feed_page(request, Post.objects.filter(author=author))
+    return page_response(page, post_row, author=author_info(author))
+
+
+@require_GET
+def post_view(request, username, post_id):
+    """Пост и порция комментариев к нему, курсор в параметре 'after'."""
+    try:
+        post = Post.objects.for_feed().values(*POST_FIELDS).get(
+            pk=post_id, author_id=get_author_or_404(username).id
+        )
+    except Post.DoesNotExist:
+        raise Http404
+    page = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).values(
+            *COMMENT_FIELDS
+        ), get_limit(request)
+    ).get_page(request.GET.get('after'))
+    return page_response(page, comment_row, post=post_row(post))
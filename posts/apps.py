@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa
+        from . import slowlog
+
+        if settings.SLOW_QUERY_MS is not None:
+            slowlog.install()
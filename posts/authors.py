@@ -0,0 +1,121 @@
+"""
+Имя пользователя из URL -> id и карточка автора через общий кеш.
+
+Почти все страницы начинают с поиска автора по имени из адреса.
+Карточка (id, имя, полное имя) хранится в кеше по имени, поэтому
+обычно автор находится без запроса к базе, а посты ищутся по
+author_id. Несуществующие имена кешируются ненадолго, чтобы запросы
+к ним тоже не доходили до базы. Карточка сбрасывается сигналами
+при сохранении и удалении пользователя (см. posts.signals);
+изменения через QuerySet.update() сигналов не вызывают и видны
+только по истечении AUTHOR_CACHE_TIMEOUT.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import router
+from django.http import Http404
+from django.urls import NoReverseMatch, Resolver404, resolve, reverse
+from django.urls.converters import IntConverter
+
+from .models import User
+
+AUTHOR_CACHE_TIMEOUT = 24 * 60 * 60
+MISSING_AUTHOR_TIMEOUT = 60
+CARD_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+class AuthorCard(namedtuple('AuthorCard', CARD_FIELDS)):
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+def cache_key(username):
+    return f'authors:{username}'
+
+
+def card_fields(user):
+    """Поля карточки пользователя, уже загруженные из базы."""
+    return tuple(user.__dict__.get(field) for field in CARD_FIELDS)
+
+
+def get_author_cards(usernames):
+    """Словарь имя -> AuthorCard для существующих пользователей."""
+    keys = {cache_key(username): username for username in set(usernames)}
+    if not keys:
+        return {}
+    cached = cache.get_many(list(keys))
+    cards = {keys[key]: card for key, card in cached.items() if card}
+    missing = [username for key, username in keys.items()
+               if key not in cached]
+    if missing:
+        found = {
+            row[1]: AuthorCard(*row)
+            for row in User.objects.filter(
+                username__in=missing
+            ).values_list(*CARD_FIELDS)
+        }
+        cache.set_many({cache_key(username): card
+                        for username, card in found.items()},
+                       AUTHOR_CACHE_TIMEOUT)
+        cache.set_many({cache_key(username): False
+                        for username in missing if username not in found},
+                       MISSING_AUTHOR_TIMEOUT)
+        cards.update(found)
+    return cards
+
+
+def get_author_card(username):
+    return get_author_cards([username]).get(username)
+
+
+def get_author_or_404(username):
+    card = get_author_card(username)
+    if card is None:
+        raise Http404
+    return card
+
+
+def card_user(card):
+    """
+    Пользователь из карточки без запроса к базе. Загружены только поля
+    карточки, остальные отложены и при обращении читаются из базы,
+    как после only().
+    """
+    return User.from_db(router.db_for_read(User), CARD_FIELDS, card)
+
+
+def forget_authors(*usernames):
+    cache.delete_many([cache_key(username)
+                       for username in usernames if username])
+
+
+def is_reserved_username(username):
+    """
+    Имя занято адресом сайта: какая-то страница с этим именем в адресе
+    открыла бы другую страницу, например /search/ вместо профиля
+    пользователя search или /api/posts/ вместо его профиля в API.
+    """
+    from . import urls
+
+    for pattern in urls.urlpatterns:
+        converters = pattern.pattern.converters
+        if 'username' not in converters:
+            continue
+        kwargs = {name: 1 if isinstance(converter, IntConverter) else 'x'
+                  for name, converter in converters.items()}
+        kwargs['username'] = username
+        view_name = f'{urls.app_name}:{pattern.name}'
+        try:
+            match = resolve(reverse(view_name, kwargs=kwargs))
+        except (NoReverseMatch, Resolver404):
+            return True
+        if match.view_name != view_name:
+            return True
+    return False
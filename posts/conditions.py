@@ -0,0 +1,144 @@
+"""
+Условные GET-запросы для лент и страницы поста.
+
+Перед рендером по индексам выбираются только id, версии и время
+изменения постов, которые окажутся на странице, и из них собираются
+ETag и Last-Modified. Правка поста, новый комментарий, смена картинки
+или группы увеличивают Post.updated_version (см. bump_version), поэтому
+повторный запрос с совпавшим валидатором получает 304 без рендера
+шаблонов. Счетчики профиля и кнопка подписки учитываются только
+в ETag: времени изменения у них нет. По той же причине Last-Modified
+отдается только анонимным посетителям: он не знает, для кого
+отрисована страница (меню, токен CSRF), и If-Modified-Since вошедшего
+пользователя мог бы получить 304 на чужую страницу. Ответы
+отмечаются Vary: Cookie.
+"""
+import hashlib
+
+from django.db.models import Exists, OuterRef
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .authors import get_author_card
+from .graph import get_graph
+from .models import Follow, Group, Post, UserStats
+from .paginators import CountedPaginator, CursorPaginator
+
+VALIDATOR_FIELDS = ('id', 'pub_date', 'updated_version', 'updated')
+
+
+def conditional_page(validators):
+    """
+    Оборачивает view в condition. validators(request, *args, **kwargs)
+    возвращает пару: значения, от которых зависит страница, и время
+    ее последнего изменения. Считается один раз на запрос.
+    """
+    def get(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            parts, last_modified = validators(request, *args, **kwargs)
+            viewer = request.user.pk if request.user.is_authenticated else 0
+            request._page_validators = (
+                hashlib.md5(repr((viewer, parts)).encode()).hexdigest(),
+                last_modified
+            )
+        return request._page_validators
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return get(request, *args, **kwargs)[1]
+
+    decorator = condition(
+        etag_func=lambda *args, **kwargs: get(*args, **kwargs)[0],
+        last_modified_func=last_modified
+    )
+    return lambda view: vary_on_cookie(decorator(view))
+
+
+def post_versions(posts):
+    return [(post.pk, post.updated_version) for post in posts]
+
+
+def last_updated(posts):
+    return max((post.updated for post in posts), default=None)
+
+
+def cursor_page(request, queryset, per_page):
+    page = CursorPaginator(
+        queryset.only(*VALIDATOR_FIELDS), per_page
+    ).get_page(request.GET.get('after'), request.GET.get('before'))
+    parts = [post_versions(page), page.next_cursor, page.previous_cursor]
+    return parts, last_updated(page)
+
+
+def index_validators(request):
+    return cursor_page(request, Post.objects.all(), 10)
+
+
+def group_validators(request, slug):
+    parts, last_modified = cursor_page(
+        request, Post.objects.filter(group__slug=slug), 10
+    )
+    if last_modified is None:
+        # Пустая группа: страница зависит только от самой группы.
+        parts.append(list(Group.objects.filter(slug=slug).values_list(
+            'title', 'description'
+        )))
+    return parts, last_modified
+
+
+def with_follow_flag(queryset, request, author_ref):
+    if not request.user.is_authenticated:
+        return queryset
+    return queryset.annotate(is_follow=Exists(Follow.objects.filter(
+        user=request.user, author=OuterRef(author_ref)
+    )))
+
+
+def author_parts(author, stats, is_follow):
+    return [
+        author.get_full_name(),
+        stats and (stats.follower_count, stats.following_count,
+                   stats.post_count),
+        is_follow,
+    ]
+
+
+def profile_validators(request, username):
+    card = get_author_card(username)
+    if card is None:
+        return [None], None
+    # Имя берется из карточки, строка автора не читается.
+    stats = with_follow_flag(
+        UserStats.objects.filter(user_id=card.id), request, 'user_id'
+    ).first()
+    # Число постов берется из счетчика вместо COUNT(*).
+    page = CountedPaginator(
+        Post.objects.filter(author_id=card.id).order_by(
+            '-pub_date', '-id'
+        ).only(*VALIDATOR_FIELDS), 5, stats and stats.post_count
+    ).get_page(request.GET.get('page'))
+    parts = author_parts(card, stats, getattr(stats, 'is_follow', None))
+    parts.append(post_versions(page))
+    if request.user.is_authenticated and request.user.pk != card.id:
+        parts.append(get_graph().mutual_followers(request.user.pk,
+                                                  card.id))
+    return parts, last_updated(page)
+
+
+def post_validators(request, username, post_id):
+    card = get_author_card(username)
+    if card is None:
+        return [None], None
+    try:
+        post = with_follow_flag(
+            Post.objects.select_related('author__stats'), request, 'author'
+        ).get(pk=post_id, author_id=card.id)
+    except Post.DoesNotExist:
+        return [None], None
+    parts = author_parts(post.author,
+                         getattr(post.author, 'stats', None),
+                         getattr(post, 'is_follow', None)) + [
+        post.updated_version, request.GET.get('after')
+    ]
+    return parts, post.updated
@@ -0,0 +1,132 @@
+"""
+Выгрузка постов и комментариев автора в NDJSON, CSV или zip-архив
+с картинками.
+
+Записи читаются из базы через iterator(chunk_size=EXPORT_CHUNK_SIZE)
+и сразу превращаются в байты, поэтому память не растет с числом
+постов. Генераторы отсюда отдаются в StreamingHttpResponse
+и в команду export_posts.
+"""
+import csv
+import io
+import time
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Post
+
+EXPORT_CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+COLUMNS = ('type', 'id', 'post_id', 'date', 'group', 'image', 'text')
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'zip': ('application/zip', 'zip'),
+}
+
+
+def iter_records(author):
+    """Посты автора, затем его комментарии, по возрастанию id."""
+    posts = Post.objects.filter(author=author).order_by('id').values_list(
+        'id', 'pub_date', 'group__slug', 'image', 'text'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for pk, date, group, image, text in posts:
+        yield dict(zip(COLUMNS, ('post', pk, None, date, group,
+                                 image or None, text)))
+    comments = Comment.objects.filter(author=author).order_by(
+        'id'
+    ).values_list(
+        'id', 'post_id', 'created', 'text'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for pk, post_id, date, text in comments:
+        yield dict(zip(COLUMNS, ('comment', pk, post_id, date, None,
+                                 None, text)))
+
+
+def ndjson_chunks(records):
+    encode = DjangoJSONEncoder(ensure_ascii=False).encode
+    for record in records:
+        yield (encode(record) + '\n').encode()
+
+
+def csv_chunks(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for record in records:
+        writer.writerow([record[column] for column in COLUMNS])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class StreamBuffer(io.RawIOBase):
+    """
+    Файл без seek, в который пишет zipfile: записанные байты
+    забираются методом pop() и сразу уходят клиенту.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def archive_entry(name, compress_type):
+    entry = zipfile.ZipInfo(name, time.localtime()[:6])
+    entry.compress_type = compress_type
+    return entry
+
+
+def zip_chunks(author):
+    """
+    Архив с posts.ndjson и картинками постов в images/.
+    Картинки уже сжаты и кладутся без сжатия.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        entry = archive_entry('posts.ndjson', zipfile.ZIP_DEFLATED)
+        with archive.open(entry, 'w', force_zip64=True) as target:
+            for chunk in ndjson_chunks(iter_records(author)):
+                target.write(chunk)
+                yield buffer.pop()
+
+        images = Post.objects.filter(author=author).exclude(
+            image=''
+        ).exclude(image__isnull=True).order_by('image').values_list(
+            'image', flat=True
+        ).distinct().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for name in images:
+            try:
+                source = default_storage.open(name, 'rb')
+            except OSError:
+                continue
+            entry = archive_entry(f'images/{name}', zipfile.ZIP_STORED)
+            with source, archive.open(entry, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    yield buffer.pop()
+    yield buffer.pop()
+
+
+def export_chunks(author, export_format):
+    if export_format == 'zip':
+        chunks = zip_chunks(author)
+    elif export_format == 'csv':
+        chunks = csv_chunks(iter_records(author))
+    else:
+        chunks = ndjson_chunks(iter_records(author))
+    return (chunk for chunk in chunks if chunk)
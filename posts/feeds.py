@@ -0,0 +1,243 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import tasks
+from .models import (Follow, Post, TimelineEntry, UserStats,
+                     comment_count_subquery)
+from .paginators import CursorPaginator
+
+PULL_AUTHORS_CACHE_KEY = 'feeds:pull_authors'
+PULL_AUTHORS_TIMEOUT = 300
+FANOUT_BATCH_SIZE = 1000
+
+
+def pull_author_ids():
+    """
+    Множество id авторов, чьи посты не раскладываются по лентам,
+    а подмешиваются при чтении (fan-out on read).
+    """
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids, returned_ids = sync_pull_authors()
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids, PULL_AUTHORS_TIMEOUT)
+        for author_id in returned_ids:
+            tasks.refill_follower_timelines.delay(author_id)
+    return author_ids
+
+
+def sync_pull_authors():
+    """
+    Сверяет режим авторов с числом подписчиков и запоминает его
+    в UserStats.fanout_pull. Возвращает множество pull-авторов
+    и список авторов, вернувшихся к раскладке по лентам: пока они
+    были pull-авторами, их новые посты и новые подписчики в ленты
+    не попадали, поэтому ленты их подписчиков надо дозаполнить.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    author_ids = set()
+    entered_ids = []
+    left_ids = []
+    for user_id, following_count, fanout_pull in UserStats.objects.filter(
+        Q(following_count__gte=limit) | Q(fanout_pull=True)
+    ).values_list('user_id', 'following_count', 'fanout_pull'):
+        if following_count >= limit:
+            author_ids.add(user_id)
+            if not fanout_pull:
+                entered_ids.append(user_id)
+        else:
+            left_ids.append(user_id)
+    if entered_ids:
+        UserStats.objects.filter(user_id__in=entered_ids).update(
+            fanout_pull=True
+        )
+    # Флаг снимает один процесс, он же и дозаполняет ленты.
+    returned_ids = [
+        author_id for author_id in left_ids
+        if UserStats.objects.filter(
+            user_id=author_id, fanout_pull=True
+        ).update(fanout_pull=False)
+    ]
+    return author_ids, returned_ids
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in pull_author_ids():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids if user_id is not None),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_posts(posts):
+    """
+    Раскладывает по лентам сразу много новых постов, например
+    при импорте: подписчики всех авторов выбираются одним запросом.
+    От постов нужны только pk, author_id и pub_date.
+    """
+    pull_ids = pull_author_ids()
+    by_author = defaultdict(list)
+    for post in posts:
+        if post.author_id not in pull_ids:
+            by_author[post.author_id].append(post)
+    if not by_author:
+        return
+    follows = Follow.objects.filter(
+        author_id__in=by_author, user__isnull=False
+    ).values_list('user_id', 'author_id').iterator()
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       pub_date=post.pub_date)
+         for user_id, author_id in follows
+         for post in by_author[author_id]),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    backfill_followers(author_id, [user_id])
+
+
+def backfill_followers(author_id, user_ids):
+    """
+    Добавляет последние посты автора в ленты нескольких подписчиков,
+    посты автора выбираются один раз.
+    """
+    if author_id not in pull_author_ids():
+        fill_followers(author_id, user_ids)
+
+
+def refill_followers(author_id):
+    """Дозаполняет ленты всех подписчиков автора."""
+    fill_followers(author_id, list(Follow.objects.filter(
+        author_id=author_id, user__isnull=False
+    ).values_list('user_id', flat=True)))
+
+
+def fill_followers(author_id, user_ids):
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT])
+    if not posts:
+        return
+    step = max(1, FANOUT_BATCH_SIZE * 10 // len(posts))
+    for start in range(0, len(user_ids), step):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for user_id in user_ids[start:start + step]
+             for post_id, pub_date in posts),
+            batch_size=FANOUT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+
+def backfill_authors(user_id, author_ids):
+    """
+    Добавляет в ленту пользователя последние посты сразу нескольких
+    авторов: посты выбираются по индексу (author, pub_date) на каждого
+    автора, а вставляются общими пачками.
+    """
+    pull_ids = pull_author_ids()
+    entries = []
+    for author_id in author_ids:
+        if author_id in pull_ids:
+            continue
+        entries.extend(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          pub_date=pub_date)
+            for post_id, pub_date in Post.objects.filter(
+                author_id=author_id
+            ).order_by('-pub_date', '-id').values_list(
+                'id', 'pub_date'
+            )[:settings.FEED_BACKFILL_LIMIT]
+        )
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def drop_from_timeline(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """
+    Курсорный паджинатор ленты подписок.
+    Страница собирается из материализованной ленты пользователя
+    и постов авторов с большим числом подписчиков, которых читаем
+    напрямую. Оба источника ограничены размером страницы, поэтому
+    стоимость чтения не зависит от числа подписок.
+
+    Если передан fields, страница состоит из словарей с этими полями
+    поста, как у Post.objects.for_feed().values(*fields).
+    """
+
+    def __init__(self, user, per_page, fields=None):
+        super().__init__(
+            Post.objects.filter(author__following__user=user), per_page
+        )
+        self.user = user
+        self.fields = fields
+
+    def fetch(self, key, backwards, limit):
+        # Множество pull-авторов пересчитывается до чтения ленты:
+        # при пересчете ленты могут быть дозаполнены.
+        pull_ids = pull_author_ids()
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if key:
+            entries = entries.filter(self.cursor_filter(
+                key, backwards, id_field='post_id'
+            ))
+        entries = entries.order_by(
+            *self.cursor_ordering(backwards, id_field='post_id')
+        ).annotate(post_comment_count=comment_count_subquery('post'))
+        if self.fields:
+            posts = [
+                {field: row['post_comment_count'] if field == 'comment_count'
+                 else row[f'post__{field}'] for field in self.fields}
+                for row in entries.values(
+                    'post_comment_count',
+                    *(f'post__{field}' for field in self.fields
+                      if field != 'comment_count')
+                )[:limit]
+            ]
+        else:
+            posts = []
+            entries = entries.select_related('post__author', 'post__group')
+            for entry in entries[:limit]:
+                entry.post.comment_count = entry.post_comment_count
+                posts.append(entry.post)
+
+        if pull_ids:
+            authors = Follow.objects.filter(
+                user=self.user, author__in=pull_ids
+            ).values('author')
+            pulled = Post.objects.for_feed().filter(author__in=authors)
+            if key:
+                pulled = pulled.filter(self.cursor_filter(key, backwards))
+            pulled = pulled.order_by(*self.cursor_ordering(backwards))
+            if self.fields:
+                pulled = pulled.values(*self.fields)
+            posts.extend(pulled[:limit])
+
+        unique_posts = {
+            self.cursor_key(post)[1]: post for post in posts
+        }.values()
+        return sorted(
+            unique_posts, key=self.cursor_key, reverse=not backwards
+        )[:limit]
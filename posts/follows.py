@@ -0,0 +1,122 @@
+"""
+Пакетные подписки и отписки.
+
+Подписки пишутся одним INSERT с пропуском конфликтов по ограничению
+unique_follow, удаляются одним DELETE; оба запроса возвращают через
+RETURNING id авторов, строки которых действительно изменились
+(SQLite 3.35+, PostgreSQL). Счетчики считаются по этим строкам, так что
+параллельные запросы на одну и ту же подписку не учитывают ее дважды.
+Сигналы Follow при этом не срабатывают, поэтому счетчики UserStats
+меняются здесь же одним UPDATE, граф подписок posts.graph обновляется
+явно, а ленты подписок заполняются задачей после коммита.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Value, When
+
+from . import graph, tasks
+from .models import Follow, TimelineEntry, UserStats
+
+MAX_BATCH = 100
+
+
+def returning_author_ids(sql, params):
+    db = connections[router.db_for_write(Follow)]
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def bump_follow_counters(user_id, author_ids, delta):
+    """
+    Одним UPDATE меняет follower_count пользователя на
+    delta * len(author_ids) и following_count каждого автора на delta.
+    """
+    queryset = UserStats.objects.filter(user_id__in=[user_id, *author_ids])
+    if delta < 0:
+        # Счетчики не уходят в минус, как в UserStats.bump.
+        follower_delta = Case(
+            When(user_id=user_id,
+                 follower_count__gte=-delta * len(author_ids),
+                 then=Value(delta * len(author_ids))),
+            default=Value(0)
+        )
+        following_delta = Case(
+            When(user_id__in=author_ids, following_count__gte=-delta,
+                 then=Value(delta)),
+            default=Value(0)
+        )
+    else:
+        follower_delta = Case(
+            When(user_id=user_id, then=Value(delta * len(author_ids))),
+            default=Value(0)
+        )
+        following_delta = Case(
+            When(user_id__in=author_ids, then=Value(delta)),
+            default=Value(0)
+        )
+    queryset.update(
+        follower_count=F('follower_count') + follower_delta,
+        following_count=F('following_count') + following_delta
+    )
+
+
+def follow_authors(user, author_ids):
+    """
+    Подписывает user на авторов, возвращает id новых подписок.
+    Уже существующие подписки и подписка на себя пропускаются.
+    """
+    author_ids = sorted(set(author_ids) - {user.pk})
+    if not author_ids:
+        return []
+    db = connections[router.db_for_write(Follow)]
+    quote = db.ops.quote_name
+    table = quote(Follow._meta.db_table)
+    user_column = quote(Follow._meta.get_field('user').column)
+    author_column = quote(Follow._meta.get_field('author').column)
+    new_ids = returning_author_ids(
+        '{} {} ({}, {}) VALUES {}{} RETURNING {}'.format(
+            db.ops.insert_statement(ignore_conflicts=True), table,
+            user_column, author_column,
+            ', '.join(['(%s, %s)'] * len(author_ids)),
+            db.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+            author_column
+        ),
+        [value for author_id in author_ids for value in (user.pk, author_id)]
+    )
+    if not new_ids:
+        return []
+
+    bump_follow_counters(user.pk, new_ids, 1)
+    transaction.on_commit(
+        lambda: tasks.backfill_timelines.delay(user.pk, new_ids)
+    )
+    graph.add_follows(user.pk, new_ids)
+    return new_ids
+
+
+def unfollow_authors(user, author_ids):
+    """Отписывает user от авторов, возвращает id удаленных подписок."""
+    author_ids = sorted(set(author_ids))
+    if not author_ids:
+        return []
+    db = connections[router.db_for_write(Follow)]
+    quote = db.ops.quote_name
+    author_column = quote(Follow._meta.get_field('author').column)
+    removed_ids = returning_author_ids(
+        'DELETE FROM {} WHERE {} = %s AND {} IN ({}) RETURNING {}'.format(
+            quote(Follow._meta.db_table),
+            quote(Follow._meta.get_field('user').column),
+            author_column, ', '.join(['%s'] * len(author_ids)),
+            author_column
+        ),
+        [user.pk, *author_ids]
+    )
+    if not removed_ids:
+        return []
+
+    bump_follow_counters(user.pk, removed_ids, -1)
+    TimelineEntry.objects.filter(
+        user=user, post__author_id__in=removed_ids
+    ).delete()
+    graph.remove_follows(user.pk, removed_ids)
+    return removed_ids
@@ -0,0 +1,352 @@
+"""
+Граф подписок в памяти процесса для рекомендаций "кого почитать"
+и общих подписчиков.
+
+Граф хранится в формате CSR: для каждого пользователя срез массива
+offsets указывает на отсортированный список id в массиве targets.
+Массивы array('i') занимают 4 байта на id, граф на миллион подписок
+весит около 8 МБ (прямые и обратные ребра). Изменения после построения
+копятся в небольших множествах поверх массивов. Граф обновляется
+сигналами Follow и пакетными подписками из posts.follows; запросы
+меняют только эти множества. Полная перестройка из базы (раз
+в FOLLOW_GRAPH_TTL секунд, чтобы увидеть изменения других процессов,
+и когда изменений становится много) идет в фоновом потоке: новые массивы
+строятся без блокировки, подменяются под ней, а изменения, пришедшие
+во время построения, повторяются поверх них.
+"""
+import bisect
+import heapq
+import logging
+import random
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+# Сколько подписок пользователя и его подписок смотреть при подборе
+# рекомендаций: ограничивает время ответа для очень активных аккаунтов.
+MAX_NEIGHBOURS = 500
+# Граф перестраивается, когда изменений больше этой доли ребер.
+COMPACT_RATIO = 0.1
+COMPACT_MIN = 1000
+
+
+def zeros(size):
+    return array('i', bytes(array('i').itemsize * size))
+
+
+def sample(ids, size=MAX_NEIGHBOURS):
+    """
+    Не больше size id из ids. Выборка случайная, чтобы у очень
+    активных аккаунтов не учитывались всегда одни и те же, самые
+    старые пользователи.
+    """
+    if len(ids) <= size:
+        return ids
+    return random.sample(list(ids), size)
+
+
+class FollowGraph:
+    """
+    out: на кого подписан пользователь, in: кто подписан на пользователя.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.built_at = 0
+        self.building = False
+        # Изменения, пришедшие во время перестройки.
+        self.pending = []
+        self.clear()
+
+    def clear(self):
+        self.out_offsets = zeros(1)
+        self.out_targets = array('i')
+        self.in_offsets = zeros(1)
+        self.in_targets = array('i')
+        self.added_out = defaultdict(set)
+        self.added_in = defaultdict(set)
+        self.removed = set()
+        self.removed_users = set()
+        self.changes = 0
+
+    @property
+    def size(self):
+        return len(self.out_offsets) - 1
+
+    def load(self, size, edges):
+        """
+        Строит массивы по ребрам (user_id, author_id), отсортированным
+        по user_id и author_id. Возвращает False, если ребер больше
+        FOLLOW_GRAPH_MAX_EDGES.
+        """
+        limit = settings.FOLLOW_GRAPH_MAX_EDGES
+        out_offsets = zeros(size + 1)
+        in_degree = zeros(size + 1)
+        out_targets = array('i')
+        for user_id, author_id in edges:
+            if len(out_targets) >= limit:
+                return False
+            top = max(user_id, author_id) + 2
+            if top > len(out_offsets):
+                out_offsets.extend(zeros(top - len(out_offsets)))
+                in_degree.extend(zeros(top - len(in_degree)))
+            out_targets.append(author_id)
+            out_offsets[user_id + 1] += 1
+            in_degree[author_id + 1] += 1
+
+        for i in range(1, len(out_offsets)):
+            out_offsets[i] += out_offsets[i - 1]
+            in_degree[i] += in_degree[i - 1]
+        in_offsets = in_degree
+        # Обратные ребра раскладываются подсчетом: пользователи идут
+        # по возрастанию, поэтому списки подписчиков тоже отсортированы.
+        in_targets = zeros(len(out_targets))
+        position = array('i', in_offsets)
+        for user_id in range(len(out_offsets) - 1):
+            for i in range(out_offsets[user_id], out_offsets[user_id + 1]):
+                author_id = out_targets[i]
+                in_targets[position[author_id]] = user_id
+                position[author_id] += 1
+
+        self.clear()
+        self.out_offsets, self.out_targets = out_offsets, out_targets
+        self.in_offsets, self.in_targets = in_offsets, in_targets
+        return True
+
+    def build(self):
+        """
+        Строит массивы из базы во временном графе и подменяет ими
+        текущие. Блокировка берется только на подмену.
+        """
+        from .models import Follow, User
+
+        size = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        edges = Follow.objects.filter(
+            user__isnull=False, author__isnull=False
+        ).order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id'
+        ).iterator(chunk_size=10000)
+        staging = FollowGraph()
+        staging.ready = staging.load(size, edges)
+        self.swap(staging)
+        if not self.ready:
+            logger.warning(
+                'Граф подписок больше FOLLOW_GRAPH_MAX_EDGES=%s ребер '
+                'и не загружен', settings.FOLLOW_GRAPH_MAX_EDGES
+            )
+
+    def swap(self, staging):
+        """
+        Берет массивы построенного графа и повторяет поверх них
+        изменения, пришедшие во время построения.
+        """
+        with self.lock:
+            self.clear()
+            if staging.ready:
+                self.out_offsets = staging.out_offsets
+                self.out_targets = staging.out_targets
+                self.in_offsets = staging.in_offsets
+                self.in_targets = staging.in_targets
+            self.ready = staging.ready
+            self.built_at = time.monotonic()
+            pending, self.pending = self.pending, []
+            if self.ready:
+                for change, args in pending:
+                    change(*args)
+
+    def refresh(self):
+        """
+        Запускает перестройку, если она еще не идет: в фоновом потоке
+        или, без FOLLOW_GRAPH_BACKGROUND, сразу.
+        """
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+            self.pending = []
+        if settings.FOLLOW_GRAPH_BACKGROUND:
+            threading.Thread(target=self.run_build, name='follow-graph',
+                             daemon=True).start()
+        else:
+            self.run_build()
+
+    def run_build(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Не удалось построить граф подписок')
+        finally:
+            with self.lock:
+                self.building = False
+                self.pending = []
+                # Неудачное построение повторяется не чаще раза в TTL,
+                # а не на каждом запросе.
+                self.built_at = time.monotonic()
+            if settings.FOLLOW_GRAPH_BACKGROUND:
+                connection.close()
+
+    def ensure_fresh(self):
+        ttl = settings.FOLLOW_GRAPH_TTL
+        if not self.built_at or (
+                ttl is not None
+                and time.monotonic() - self.built_at > ttl):
+            self.refresh()
+
+    def reset(self):
+        with self.lock:
+            self.ready = False
+            self.built_at = 0
+            self.clear()
+
+    def row(self, offsets, targets, node):
+        if node >= len(offsets) - 1:
+            return targets[0:0]
+        return targets[offsets[node]:offsets[node + 1]]
+
+    def has_base_edge(self, user_id, author_id):
+        if user_id >= self.size:
+            return False
+        start = self.out_offsets[user_id]
+        end = self.out_offsets[user_id + 1]
+        i = bisect.bisect_left(self.out_targets, author_id, start, end)
+        return i < end and self.out_targets[i] == author_id
+
+    def following(self, user_id):
+        """id авторов, на которых подписан пользователь."""
+        if user_id in self.removed_users:
+            return set()
+        ids = set(self.row(self.out_offsets, self.out_targets, user_id))
+        if self.removed:
+            ids = {author_id for author_id in ids
+                   if (user_id, author_id) not in self.removed}
+        return (ids | self.added_out.get(user_id, set())) - self.removed_users
+
+    def followers(self, author_id):
+        """id подписчиков автора."""
+        if author_id in self.removed_users:
+            return set()
+        ids = set(self.row(self.in_offsets, self.in_targets, author_id))
+        if self.removed:
+            ids = {user_id for user_id in ids
+                   if (user_id, author_id) not in self.removed}
+        return (ids | self.added_in.get(author_id, set())) - self.removed_users
+
+    def follower_count(self, author_id):
+        if self.removed or self.removed_users or self.added_in:
+            return len(self.followers(author_id))
+        return len(self.row(self.in_offsets, self.in_targets, author_id))
+
+    def add_edge(self, user_id, author_id):
+        self.apply(self.insert_edge, user_id, author_id)
+
+    def remove_edge(self, user_id, author_id):
+        self.apply(self.delete_edge, user_id, author_id)
+
+    def remove_user(self, user_id):
+        self.apply(self.delete_user, user_id)
+
+    def apply(self, change, *args):
+        """
+        Применяет изменение к текущему графу и запоминает его, если
+        идет перестройка: новые массивы могли прочитать базу раньше.
+        """
+        with self.lock:
+            if self.building:
+                self.pending.append((change, args))
+            if not self.ready:
+                return
+            change(*args)
+            self.changes += 1
+            if self.changes > max(COMPACT_MIN,
+                                  len(self.out_targets) * COMPACT_RATIO):
+                self.refresh()
+
+    def insert_edge(self, user_id, author_id):
+        if (user_id, author_id) in self.removed:
+            self.removed.discard((user_id, author_id))
+        elif not self.has_base_edge(user_id, author_id):
+            self.added_out[user_id].add(author_id)
+            self.added_in[author_id].add(user_id)
+
+    def delete_edge(self, user_id, author_id):
+        if author_id in self.added_out.get(user_id, ()):
+            self.added_out[user_id].discard(author_id)
+            self.added_in[author_id].discard(user_id)
+        elif self.has_base_edge(user_id, author_id):
+            self.removed.add((user_id, author_id))
+
+    def delete_user(self, user_id):
+        self.removed_users.add(user_id)
+
+    def mutual_followers(self, user_id, author_id):
+        """
+        Подписчики автора среди тех, на кого подписан пользователь,
+        по возрастанию id.
+        """
+        with self.lock:
+            return sorted(self.following(user_id)
+                          & self.followers(author_id))
+
+    def suggestions(self, user_id, limit=5):
+        """
+        Друзья друзей: авторы, на которых подписаны подписки
+        пользователя, по числу таких подписок, затем по числу
+        подписчиков. Возвращает список пар (id автора, число общих).
+        """
+        with self.lock:
+            following = self.following(user_id)
+            scores = defaultdict(int)
+            for friend_id in sample(following):
+                for author_id in sample(self.following(friend_id)):
+                    scores[author_id] += 1
+            scores.pop(user_id, None)
+            for author_id in following:
+                scores.pop(author_id, None)
+            return heapq.nsmallest(
+                limit, scores.items(),
+                key=lambda item: (-item[1], -self.follower_count(item[0]),
+                                  item[0])
+            )
+
+
+_graph = FollowGraph()
+
+
+def get_graph():
+    """
+    Граф подписок. Устаревший граф перестраивается в фоне, пока
+    отвечает прежний; до первого построения граф пуст.
+    """
+    _graph.ensure_fresh()
+    return _graph
+
+
+# Граф меняется только после коммита, чтобы откаченные подписки
+# не попадали в рекомендации.
+
+def reset():
+    _graph.reset()
+
+
+def add_follows(user_id, author_ids):
+    transaction.on_commit(lambda: [
+        _graph.add_edge(user_id, author_id) for author_id in author_ids
+    ])
+
+
+def remove_follows(user_id, author_ids):
+    transaction.on_commit(lambda: [
+        _graph.remove_edge(user_id, author_id) for author_id in author_ids
+    ])
+
+
+def remove_user(user_id):
+    transaction.on_commit(lambda: _graph.remove_user(user_id))
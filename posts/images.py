@@ -0,0 +1,126 @@
+"""
+Адаптивные копии картинок постов.
+
+Исходная картинка открывается один раз, обрезается под пропорции
+карточки и сохраняется в нескольких ширинах и форматах (AVIF, WebP, JPEG).
+Адреса и размеры копий хранятся в Post.thumbnails, из них шаблоны
+собирают <picture> с srcset/sizes и атрибутами width/height.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+try:
+    # Плагин добавляет в Pillow кодек AVIF, если он установлен.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+SAVE_OPTIONS = {
+    'AVIF': {'quality': 60},
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+EXTENSIONS = {'AVIF': 'avif', 'WEBP': 'webp', 'JPEG': 'jpg'}
+FALLBACK_FORMAT = 'JPEG'
+
+
+def supported_formats():
+    """
+    Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow.
+    JPEG нужен всегда: это запасной вариант для старых браузеров.
+    """
+    Image.init()
+    return [image_format for image_format in settings.POST_IMAGE_FORMATS
+            if image_format in Image.SAVE
+            and image_format != FALLBACK_FORMAT] + [FALLBACK_FORMAT]
+
+
+def profile():
+    """
+    Подпись текущих настроек. Если она изменилась, копии картинок
+    нужно пересоздать.
+    """
+    widths = ','.join(str(width) for width in settings.POST_IMAGE_WIDTHS)
+    return f'{widths}:{",".join(supported_formats())}'
+
+
+def target_widths(source_width):
+    """
+    Ширины копий без увеличения исходника. Самая узкая копия
+    делается всегда, чтобы у поста была хотя бы одна.
+    """
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [width for width in widths if width <= source_width] or widths[:1]
+
+
+def encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    return buffer.getvalue()
+
+
+def build_derivatives(post):
+    """
+    Сохраняет копии картинки поста и возвращает словарь
+    для Post.thumbnails.
+    """
+    with post.image.open('rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'A' in source.getbands()
+                                else 'RGB')
+
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    name = os.path.splitext(os.path.basename(post.image.name))[0]
+    formats = supported_formats()
+    variants = []
+    for width in target_widths(source.width):
+        height = round(width * ratio_height / ratio_width)
+        resized = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for image_format in formats:
+            path = default_storage.save(
+                f'posts/derivatives/{post.pk}/{name}-{width}.'
+                f'{EXTENSIONS.get(image_format, image_format.lower())}',
+                ContentFile(encode(resized, image_format))
+            )
+            variants.append({
+                'name': path,
+                'url': default_storage.url(path),
+                'type': Image.MIME[image_format],
+                'width': width,
+                'height': height,
+            })
+
+    sources = []
+    for image_format in formats:
+        mime = Image.MIME[image_format]
+        sources.append({
+            'type': mime,
+            'srcset': ', '.join(f'{variant["url"]} {variant["width"]}w'
+                                for variant in variants
+                                if variant['type'] == mime),
+        })
+    fallback_mime = Image.MIME[FALLBACK_FORMAT]
+    fallback = [variant for variant in variants
+                if variant['type'] == fallback_mime]
+    card_width = settings.POST_IMAGE_RATIO[0]
+    card = ([variant for variant in fallback if variant['width'] <= card_width]
+            or fallback)[-1]
+    return {
+        'source': post.image.name,
+        'profile': profile(),
+        'width': source.width,
+        'height': source.height,
+        'variants': variants,
+        'sources': [item for item in sources if item['type'] != fallback_mime],
+        'card': dict(card, srcset=next(item['srcset'] for item in sources
+                                       if item['type'] == fallback_mime)),
+    }
@@ -0,0 +1,104 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import Engine, RequestContext, engines
+from django.test import RequestFactory
+
+from posts.models import Post
+from posts.paginators import CursorPaginator
+from posts.warmup import warm_templates
+
+# Главная страница с двумя вариантами вывода карточек:
+# include на каждой итерации цикла и тег post_cards.
+INDEX = '''{% extends "base.html" %}
+{% block content %}
+{% load post_cards %}
+    <div class="container">
+        {% include "menu.html" with index=True %}
+            CARDS
+        <div class="row">
+        {% include "paginator.html" with items=page paginator=paginator%}
+        </div>
+    </div>
+{% endblock %}'''
+CARDS = {
+    'include': ('{% for post in page %}'
+                '{% include "posts/post_item.html" with post=post %}'
+                '{% endfor %}'),
+    'post_cards': '{% post_cards page %}',
+}
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера главной страницы на текущей базе: '
+            'без кеша шаблонов и с прогретым кеширующим загрузчиком, '
+            'с include карточки в цикле и с тегом post_cards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        page = CursorPaginator(Post.objects.for_feed(), 10).get_page()
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = {'page': page, 'paginator': page.paginator}
+
+        self.stdout.write(
+            f'{"загрузчик":<12}{"карточки":<12}{"первый, мс":>12}'
+            f'{"среднее, мс":>14}{"медиана, мс":>14}'
+        )
+        for cached in (False, True):
+            for markup, cards in CARDS.items():
+                engine = self.make_engine(cached)
+                if cached:
+                    warm_templates(engine)
+                template = engine.from_string(INDEX.replace('CARDS', cards))
+                first, times = self.measure(
+                    template, RequestContext(request, context),
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'{"cached" if cached else "disk":<12}{markup:<12}'
+                    f'{first * 1000:>12.2f}'
+                    f'{statistics.mean(times) * 1000:>14.3f}'
+                    f'{statistics.median(times) * 1000:>14.3f}'
+                )
+
+    def make_engine(self, cached):
+        """
+        Отдельный движок с настройками проекта, чтобы каждый вариант
+        начинал с пустого кеша загрузчика.
+        """
+        config = settings.TEMPLATES[0]
+        project = engines['django'].engine
+        loaders = [('django.template.loaders.cached.Loader', LOADERS)]
+        return Engine(
+            dirs=config['DIRS'],
+            loaders=loaders if cached else LOADERS,
+            context_processors=project.context_processors,
+            libraries=project.libraries,
+            builtins=[],
+        )
+
+    def measure(self, template, context, repeat):
+        """
+        Время первого рендера (для кеширующего загрузчика - после
+        прогрева) и времена последующих рендеров.
+        """
+        started = time.perf_counter()
+        template.render(context)
+        first = time.perf_counter() - started
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            template.render(context)
+            times.append(time.perf_counter() - started)
+        return first, times
@@ -0,0 +1,129 @@
+import re
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, resolve, reverse
+
+from posts import urls as posts_urls
+from posts.models import Group, Post, User, UserStats
+
+# Полный проход по таблице или сортировка во временном B-дереве.
+# SEARCH и SCAN ... USING INDEX идут по индексу и не считаются проблемой.
+FULL_SCAN_RE = re.compile(
+    r'\bSCAN (?:TABLE )?(?P<table>\w+)(?!.*\bUSING\b)'
+    r'|Seq Scan on (?P<seq_table>\w+)'
+    r'|USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'
+)
+
+
+class Command(BaseCommand):
+    help = ('Открывает каждую страницу приложения posts на текущей базе '
+            'и печатает план выполнения каждого ее SQL-запроса. '
+            'Полные проходы по таблицам и сортировки без индекса '
+            'помечаются. Изменения в базе откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='От чьего имени открывать страницы. По умолчанию берется '
+                 'пользователь с наибольшим числом подписок'
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если найден полный проход '
+                 'по таблице'
+        )
+        parser.add_argument(
+            '--ignore', nargs='*', default=[],
+            help='Таблицы, полный проход по которым допустим'
+        )
+
+    def handle(self, *args, **options):
+        viewer = self.get_viewer(options['username'])
+        kwargs = self.sample_kwargs()
+        factory = RequestFactory()
+        problems = 0
+
+        for name, url in self.iter_urls(kwargs):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name} {url}'))
+            request = factory.get(url)
+            request.user = viewer
+            view = resolve(url)
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    try:
+                        view.func(request, *view.args, **view.kwargs)
+                    except Http404:
+                        self.stdout.write('  404, план не построен')
+                seen = set()
+                for query in captured.captured_queries:
+                    sql = query['sql']
+                    if sql in seen or not sql.lstrip().upper().startswith(
+                            ('SELECT', 'WITH')):
+                        continue
+                    seen.add(sql)
+                    problems += self.explain(sql, options['ignore'])
+                transaction.set_rollback(True)
+
+        if options['check'] and problems:
+            raise CommandError(f'Запросов без индекса: {problems}')
+        self.stdout.write(f'Запросов без индекса: {problems}')
+
+    def get_viewer(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}')
+        stats = UserStats.objects.select_related('user').order_by(
+            '-follower_count'
+        ).first()
+        return stats.user if stats else AnonymousUser()
+
+    def sample_kwargs(self):
+        """Параметры маршрутов: самый свежий пост, его автор и группа."""
+        post = Post.objects.select_related('author').order_by(
+            '-pub_date', '-id'
+        ).first()
+        if post is None:
+            raise CommandError('В базе нет постов, заполните ее seed_yatube')
+        group = post.group or Group.objects.order_by('id').first()
+        return {
+            'username': post.author.username,
+            'post_id': post.pk,
+            'slug': group.slug if group else 'none',
+        }
+
+    def iter_urls(self, kwargs):
+        for pattern in posts_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            names = pattern.pattern.converters.keys()
+            name = f'{posts_urls.app_name}:{pattern.name}'
+            yield name, reverse(
+                name, kwargs={key: kwargs[key] for key in names}
+            )
+
+    def explain(self, sql, ignore):
+        """Печатает план запроса и возвращает 1, если он без индекса."""
+        prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                  else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            plan = [' '.join(str(column) for column in row[-1:])
+                    for row in cursor.fetchall()]
+
+        bad = []
+        for line in plan:
+            match = FULL_SCAN_RE.search(line)
+            if match and (match['table'] or match['seq_table']) not in ignore:
+                bad.append(line)
+        self.stdout.write(f'  {sql}')
+        for line in plan:
+            style = self.style.ERROR if line in bad else str
+            self.stdout.write(style(f'    {line}'))
+        return 1 if bad else 0
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS, export_chunks
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты и комментарии автора в NDJSON, CSV или '
+            'zip-архив с картинками. Записи читаются из базы порциями, '
+            'память не зависит от их числа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--output',
+            help='Файл для выгрузки. Без него NDJSON и CSV печатаются '
+                 'в stdout, для zip файл обязателен'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        chunks = export_chunks(author, options['format'])
+
+        if not options['output']:
+            if options['format'] == 'zip':
+                raise CommandError('Для zip укажите --output')
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        self.stderr.write(f'Записано {size} байт в {options["output"]}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tasks import generate_thumbnails, thumbnails_outdated
+
+
+class Command(BaseCommand):
+    help = ('Ставит в очередь подготовку миниатюр для постов, у которых '
+            'их еще нет или они сделаны для другой картинки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры для всех постов с картинками'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).only(
+            'image', 'thumbnails'
+        ).order_by()
+        queued = 0
+        for post in posts.iterator():
+            if options['force'] or thumbnails_outdated(post):
+                generate_thumbnails.delay(post.pk)
+                queued += 1
+        self.stdout.write(f'Поставлено в очередь: {queued}')
@@ -0,0 +1,421 @@
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import authors, feeds, search, tasks
+from posts.models import Comment, Group, Post, User, UserStats
+
+
+class ImportedPost(NamedTuple):
+    """Строка posts_post. Остальные поля берут значения по умолчанию."""
+    id: int
+    author_id: int
+    group_id: Optional[int]
+    text: str
+    image: str
+    pub_date: datetime
+    updated: datetime
+    thumbnails: dict
+    updated_version: int
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class ImportedComment(NamedTuple):
+    """Строка posts_comment."""
+    id: int
+    post_id: int
+    author_id: int
+    text: str
+    created: datetime
+
+    @property
+    def pk(self):
+        return self.id
+
+
+# Поля, которые команда пишет в таблицы.
+POST_FIELDS = ImportedPost._fields
+COMMENT_FIELDS = ImportedComment._fields
+# Поля с id из выгрузки по типам записей, они должны быть целыми
+# числами. У записей других типов export_posts пишет в них null.
+ID_FIELDS = {'post': ('id',), 'comment': ('id', 'post_id')}
+
+
+def insert_rows(model, fields, rows):
+    """
+    Вставляет строки одним executemany. Это в несколько раз быстрее
+    bulk_create: не создаются экземпляры моделей, не выполняется
+    pre_save (auto_now_add не затирает даты из выгрузки), и пачка
+    не дробится на запросы по 999 параметров. Значения готовятся
+    get_db_prep_save полей модели. Строки с уже занятым id пропускаются,
+    поэтому повтор пачки после сбоя безопасен. Возвращает вставленные
+    строки.
+    """
+    existing = set(model.objects.filter(
+        pk__in=[row.pk for row in rows]
+    ).values_list('pk', flat=True))
+    rows = [row for row in rows if row.pk not in existing]
+    if not rows:
+        return rows
+    # Сам объект подключения, а не прокси django.db.connection:
+    # обращение к прокси на каждое значение заметно дороже вставки.
+    db = connections[router.db_for_write(model)]
+    model_fields = [model._meta.get_field(name) for name in fields]
+    quote = db.ops.quote_name
+    sql = '{} {} ({}) VALUES ({}){}'.format(
+        db.ops.insert_statement(ignore_conflicts=True),
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in model_fields),
+        ', '.join(['%s'] * len(model_fields)),
+        db.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with db.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(value, db)
+             for field, value in zip(model_fields, row)]
+            for row in rows
+        ])
+    return rows
+
+
+def invalid_field(record):
+    """Первое поле записи с id, которое не приводится к int, или None."""
+    for field in ID_FIELDS.get(record.get('type'), ()):
+        if field not in record:
+            continue
+        try:
+            int(record[field])
+        except (TypeError, ValueError):
+            return field
+    return None
+
+
+def reset_sequences(*models):
+    """
+    Сдвигает счетчики id за вставленные строки. insert_rows пишет id
+    явно, и PostgreSQL не двигает последовательность сам: следующий
+    обычный пост получил бы уже занятый id. В SQLite id берется из
+    max(rowid), и запросов нет.
+    """
+    db = connections[router.db_for_write(models[0])]
+    statements = db.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with db.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def delete_images(names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
+
+
+class Command(BaseCommand):
+    help = ('Импортирует группы, посты и комментарии из NDJSON, например '
+            'из выгрузки export_posts. Каждая строка - объект с полем type: '
+            'group (slug, title, description), post (id, author, group, '
+            'date, image, text) или comment (id, post_id, author, date, '
+            'text). Комментарии ссылаются на id постов из того же файла '
+            'и должны идти после них. Вставка идет пачками, после каждой '
+            'пачки сохраняется контрольная точка, и прерванный импорт '
+            'продолжается с нее.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или - для stdin')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--author',
+            help='Автор записей, у которых не указано поле author'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать отсутствующих авторов без пароля. Без флага '
+                 'их записи пропускаются'
+        )
+        parser.add_argument(
+            '--images',
+            help='Каталог с картинками: поле image поста - путь '
+                 'относительно него. Без каталога картинки не переносятся'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.users = {}
+        self.groups = {}
+        self.stats = Counter()
+        # get_current_timezone на каждую дату заметно тормозит импорт.
+        self.timezone = timezone.get_default_timezone()
+
+        path = options['path']
+        checkpoint_path = options['checkpoint'] or (
+            None if path == '-' else f'{path}.checkpoint'
+        )
+        checkpoint = self.load_checkpoint(checkpoint_path)
+        self.post_offset = checkpoint['post_offset']
+        self.comment_offset = checkpoint['comment_offset']
+        if checkpoint['line']:
+            self.stderr.write(f'Продолжение со строки {checkpoint["line"]}')
+
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        with source:
+            batch = []
+            line_number = 0
+            for line_number, line in enumerate(source, 1):
+                if line_number <= checkpoint['line'] or not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise CommandError(f'Строка {line_number}: не JSON')
+                if not isinstance(record, dict):
+                    raise CommandError(f'Строка {line_number}: не объект')
+                field = invalid_field(record)
+                if field:
+                    raise CommandError(
+                        f'Строка {line_number}: поле {field} не число'
+                    )
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, checkpoint_path, line_number)
+                    batch = []
+            self.flush(batch, checkpoint_path, line_number)
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        cache.delete(feeds.PULL_AUTHORS_CACHE_KEY)
+        self.stdout.write(', '.join(
+            f'{name} {count}' for name, count in sorted(self.stats.items())
+        ) or 'Нет записей')
+
+    def load_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        # id из выгрузки сдвигаются за последние id в базе, поэтому
+        # комментарии находят свои посты без таблицы соответствий,
+        # а при продолжении импорта id получаются теми же.
+        return {
+            'line': 0,
+            'post_offset': Post.objects.aggregate(last=Max('id'))['last']
+            or 0,
+            'comment_offset': Comment.objects.aggregate(
+                last=Max('id')
+            )['last'] or 0,
+        }
+
+    def save_checkpoint(self, path, line_number):
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'line': line_number, 'post_offset': self.post_offset,
+                       'comment_offset': self.comment_offset}, file)
+        os.replace(f'{path}.tmp', path)
+
+    def flush(self, records, checkpoint_path, line_number):
+        if not records:
+            return
+        # Картинки копируются до вставки строк: имя файла в хранилище
+        # пишется в пост. Если пачка откатилась, файлы удаляются.
+        self.saved_images = []
+        try:
+            with transaction.atomic():
+                self.resolve_users(records)
+                self.create_groups(records)
+                posts = self.create_posts(records)
+                comments = self.create_comments(records)
+                reset_sequences(Post, Comment)
+                transaction.on_commit(lambda: [
+                    tasks.generate_thumbnails.delay(post.pk)
+                    for post in posts if post.image
+                ])
+        except BaseException:
+            delete_images(self.saved_images)
+            raise
+        self.save_checkpoint(checkpoint_path, line_number)
+        self.stats['постов'] += len(posts)
+        self.stats['комментариев'] += len(comments)
+
+    def resolve_users(self, records):
+        """Заполняет кеш имя -> id для авторов пачки."""
+        default = self.options['author']
+        missing = {record.get('author') or default for record in records
+                   if record.get('type') in ('post', 'comment')}
+        missing -= set(self.users)
+        missing.discard(None)
+        if not missing:
+            return
+        self.users.update(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'id'))
+        missing -= set(self.users)
+        if missing and self.options['create_users']:
+            password = make_password(None)
+            User.objects.bulk_create(
+                User(username=username, password=password)
+                for username in missing
+            )
+            created = dict(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'id'))
+            UserStats.objects.bulk_create(
+                UserStats(user_id=user_id) for user_id in created.values()
+            )
+            self.users.update(created)
+            # bulk_create не вызывает post_save: имена могли быть
+            # закешированы как несуществующие.
+            authors.forget_authors(*created)
+            self.stats['пользователей'] += len(created)
+
+    def author_id(self, record):
+        author_id = self.users.get(
+            record.get('author') or self.options['author']
+        )
+        if author_id is None:
+            self.stats['пропущено без автора'] += 1
+        return author_id
+
+    def create_groups(self, records):
+        """Создает группы из записей group и незнакомых slug постов."""
+        titles = {}
+        for record in records:
+            if record.get('type') == 'group':
+                titles[record['slug']] = record
+            elif record.get('type') == 'post' and record.get('group'):
+                titles.setdefault(record['group'], {'slug': record['group']})
+        missing = set(titles) - set(self.groups)
+        if not missing:
+            return
+        Group.objects.bulk_create(
+            (Group(slug=slug, title=titles[slug].get('title') or slug,
+                   description=titles[slug].get('description', ''))
+             for slug in missing),
+            ignore_conflicts=True
+        )
+        self.groups.update(Group.objects.filter(
+            slug__in=missing
+        ).values_list('slug', 'id'))
+
+    def parse_date(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            date = datetime.fromisoformat(value)
+        except ValueError:
+            date = parse_datetime(value)
+        if date is None:
+            return timezone.now()
+        if settings.USE_TZ and timezone.is_naive(date):
+            return timezone.make_aware(date, self.timezone)
+        if not settings.USE_TZ and timezone.is_aware(date):
+            return timezone.make_naive(date, self.timezone)
+        return date
+
+    def image(self, name):
+        directory = self.options['images']
+        if not name or not directory:
+            return ''
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            self.stats['картинок не найдено'] += 1
+            return ''
+        with open(path, 'rb') as file:
+            name = default_storage.save(name, File(file))
+        self.saved_images.append(name)
+        return name
+
+    def create_posts(self, records):
+        posts = []
+        for record in records:
+            if record.get('type') != 'post' or 'id' not in record:
+                continue
+            author_id = self.author_id(record)
+            if author_id is None:
+                continue
+            date = self.parse_date(record.get('date'))
+            posts.append(ImportedPost(
+                id=self.post_offset + int(record['id']),
+                author_id=author_id,
+                group_id=self.groups.get(record.get('group')),
+                text=record.get('text', ''),
+                image=self.image(record.get('image')),
+                pub_date=date,
+                updated=date,
+                thumbnails={},
+                updated_version=0,
+            ))
+        if not posts:
+            return posts
+        inserted = insert_rows(Post, POST_FIELDS, posts)
+        # Посты, уже загруженные прошлым запуском, пропущены, и копии
+        # их картинок не нужны.
+        delete_images(set(post.image for post in posts)
+                      - set(post.image for post in inserted))
+        posts = inserted
+        UserStats.bump_many('post_count', Counter(
+            post.author_id for post in posts
+        ))
+        feeds.fan_out_posts(posts)
+        search.get_backend().index_posts(posts)
+        return posts
+
+    def create_comments(self, records):
+        comments = []
+        for record in records:
+            if (record.get('type') != 'comment' or 'id' not in record
+                    or 'post_id' not in record):
+                continue
+            author_id = self.author_id(record)
+            if author_id is None:
+                continue
+            comments.append(ImportedComment(
+                id=self.comment_offset + int(record['id']),
+                post_id=self.post_offset + int(record['post_id']),
+                author_id=author_id,
+                text=record.get('text', ''),
+                created=self.parse_date(record.get('date')),
+            ))
+        if not comments:
+            return comments
+        # Пост комментария мог быть пропущен, например без автора.
+        existing = set(Post.objects.filter(
+            id__in={comment.post_id for comment in comments}
+        ).values_list('id', flat=True))
+        skipped = len(comments)
+        comments = [comment for comment in comments
+                    if comment.post_id in existing]
+        skipped -= len(comments)
+        if skipped:
+            self.stats['пропущено без поста'] += skipped
+
+        comments = insert_rows(Comment, COMMENT_FIELDS, comments)
+        # Пост мог прийти в прошлой пачке или уже быть на сайте, и его
+        # карточка закеширована без новых комментариев.
+        Post.objects.filter(
+            pk__in={comment.post_id for comment in comments}
+        ).bump_version()
+        search.get_backend().index_comments(comments)
+        return comments
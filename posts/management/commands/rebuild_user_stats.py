@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Follow, Post, User, UserStats
+
+BATCH_SIZE = 500
+
+
+def count_by(queryset, field):
+    return dict(
+        queryset.order_by().values(field).annotate(total=Count('id'))
+        .values_list(field, 'total')
+    )
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики UserStats по таблицам Follow и Post. '
+            'С флагом --check только сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Не исправлять счетчики, а завершиться с ошибкой '
+                 'при расхождении'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by('id').values_list('id', flat=True)
+        batch = []
+        mismatched = 0
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) == BATCH_SIZE:
+                mismatched += self.process(batch, options['check'])
+                batch = []
+        if batch:
+            mismatched += self.process(batch, options['check'])
+
+        if options['check']:
+            if mismatched:
+                raise CommandError(f'Расхождений в счетчиках: {mismatched}')
+            self.stdout.write('Счетчики в порядке')
+        else:
+            self.stdout.write(f'Исправлено записей: {mismatched}')
+
+    def process(self, user_ids, check):
+        """Сверяет и при необходимости исправляет пачку пользователей."""
+        if check:
+            return len(self.compare(user_ids, check))
+        # Строки счетчиков блокируются до подсчета: сигналы, которые
+        # двигают их через F(), ждут конца транзакции и прибавляются
+        # к уже исправленным значениям, а не затираются ими.
+        with transaction.atomic():
+            list(UserStats.objects.select_for_update().filter(
+                user_id__in=user_ids
+            ).values_list('pk', flat=True))
+            mismatched = self.compare(user_ids, check)
+            # Меняются только счетчики: fanout_pull и прочие поля
+            # остаются как есть.
+            UserStats.objects.bulk_update(
+                [stats for stats in mismatched if not stats._state.adding],
+                UserStats.COUNTERS
+            )
+            UserStats.objects.bulk_create(
+                [stats for stats in mismatched if stats._state.adding],
+                ignore_conflicts=True
+            )
+        return len(mismatched)
+
+    def compare(self, user_ids, check):
+        """
+        Строки UserStats пачки с неверными счетчиками, уже с верными
+        значениями. Для отсутствующих строк возвращаются новые
+        несохраненные (_state.adding).
+        """
+        follower = count_by(
+            Follow.objects.filter(user__in=user_ids, author__isnull=False),
+            'user'
+        )
+        following = count_by(
+            Follow.objects.filter(author__in=user_ids, user__isnull=False),
+            'author'
+        )
+        posts = count_by(Post.objects.filter(author__in=user_ids), 'author')
+        stored = UserStats.objects.in_bulk(user_ids)
+
+        mismatched = []
+        for user_id in user_ids:
+            expected = {
+                'follower_count': follower.get(user_id, 0),
+                'following_count': following.get(user_id, 0),
+                'post_count': posts.get(user_id, 0),
+            }
+            stats = stored.get(user_id)
+            if stats is not None and stats.as_counters() == expected:
+                continue
+            if check:
+                self.stderr.write(f'user {user_id}: ожидалось {expected}')
+            if stats is None:
+                stats = UserStats(user_id=user_id)
+            for field, value in expected.items():
+                setattr(stats, field, value)
+            mismatched.append(stats)
+        return mismatched
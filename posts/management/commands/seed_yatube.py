@@ -0,0 +1,210 @@
+import os
+import random
+from collections import defaultdict
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts import feeds, search
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'день город друг время жизнь дело работа слово место лицо рука дом '
+    'вопрос сторона страна мир случай голова ребенок сила конец вид '
+    'система часть отношение человек глаз жена год вода земля проект '
+    'книга музыка дорога утро вечер кофе кот море лето зима поезд '
+    'новый хороший большой последний русский главный старый красивый '
+    'сказать говорить знать стать видеть хотеть идти думать смотреть'
+).split()
+
+IMAGE_VARIANTS = 20
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных замеров. '
+            'При одинаковом --seed данные получаются одинаковыми.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой, от 0 до 1'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имен пользователей и адресов групп'
+        )
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Не заполнять материализованные ленты подписок'
+        )
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        images = self.create_images() if options['images'] else []
+        post_ids = self.create_posts(options['posts'], user_ids, group_ids,
+                                     images, options['images'])
+        self.create_comments(options['comments'], user_ids, post_ids)
+        follows = self.create_follows(user_ids, options['follows'])
+
+        call_command('rebuild_user_stats', stdout=StringIO())
+        search.rebuild_index()
+        cache.delete(feeds.PULL_AUTHORS_CACHE_KEY)
+        if not options['skip_timelines']:
+            followers = defaultdict(list)
+            for user_id, author_id in follows:
+                followers[author_id].append(user_id)
+            for author_id, reader_ids in followers.items():
+                feeds.backfill_followers(author_id, reader_ids)
+
+        self.stdout.write(
+            f'Создано: пользователей {len(user_ids)}, групп {len(group_ids)}, '
+            f'постов {len(post_ids)}, комментариев {options["comments"]}, '
+            f'подписок {len(follows)}'
+        )
+
+    def bulk_create(self, model, objs):
+        """Вставляет объекты пачками, каждая пачка в своей транзакции."""
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+
+    def new_ids(self, model, last_id):
+        return list(model.objects.filter(id__gt=last_id or 0).order_by(
+            'id'
+        ).values_list('id', flat=True))
+
+    def text(self, median_words):
+        """Текст с логнормальным распределением длины, как у живых постов."""
+        length = max(1, int(self.rnd.lognormvariate(0, 0.9) * median_words))
+        return ' '.join(self.rnd.choices(WORDS, k=length)).capitalize()
+
+    def create_users(self, count):
+        last_id = User.objects.aggregate(last=Max('id'))['last']
+        password = make_password('password')
+        self.bulk_create(User, (
+            User(username=f'{self.prefix}_user_{i}', password=password)
+            for i in range(count)
+        ))
+        return self.new_ids(User, last_id)
+
+    def create_groups(self, count):
+        last_id = Group.objects.aggregate(last=Max('id'))['last']
+        self.bulk_create(Group, (
+            Group(title=f'Сообщество {i}', slug=f'{self.prefix}-group-{i}',
+                  description=self.text(20))
+            for i in range(count)
+        ))
+        return self.new_ids(Group, last_id)
+
+    def create_images(self):
+        """Несколько синтетических картинок, общих для всех постов."""
+        from PIL import Image
+
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for i in range(IMAGE_VARIANTS):
+            name = f'posts/{self.prefix}_{i}.jpg'
+            color = tuple(self.rnd.randrange(256) for _ in range(3))
+            Image.new('RGB', (1280, 720), color).save(
+                os.path.join(settings.MEDIA_ROOT, name), quality=85
+            )
+            names.append(name)
+        return names
+
+    def create_posts(self, count, user_ids, group_ids, images, image_share):
+        """
+        Авторы выбираются по степенному закону: немногие пишут много.
+        """
+        last_id = Post.objects.aggregate(last=Max('id'))['last']
+        weights = self.power_law_weights(len(user_ids))
+        groups = group_ids + [None] * len(group_ids)
+        self.bulk_create(Post, (
+            Post(
+                text=self.text(40),
+                author_id=self.rnd.choices(user_ids, cum_weights=weights)[0],
+                group_id=self.rnd.choice(groups) if groups else None,
+                image=(self.rnd.choice(images)
+                       if images and self.rnd.random() < image_share else '')
+            )
+            for _ in range(count)
+        ))
+        return self.new_ids(Post, last_id)
+
+    def create_comments(self, count, user_ids, post_ids):
+        if not post_ids:
+            return
+        weights = self.power_law_weights(len(post_ids))
+        self.bulk_create(Comment, (
+            Comment(
+                post_id=self.rnd.choices(post_ids, cum_weights=weights)[0],
+                author_id=self.rnd.choice(user_ids),
+                text=self.text(12)
+            )
+            for _ in range(count)
+        ))
+
+    def create_follows(self, user_ids, average):
+        """
+        Граф подписок со степенным распределением популярности авторов.
+        Возвращает список пар (user_id, author_id).
+        """
+        if len(user_ids) < 2:
+            return []
+        weights = self.power_law_weights(len(user_ids))
+        follows = []
+        for user_id in user_ids:
+            wanted = min(len(user_ids) - 1,
+                         int(self.rnd.expovariate(1 / average)) if average
+                         else 0)
+            authors = set()
+            for _ in range(wanted * 3):
+                if len(authors) == wanted:
+                    break
+                author_id = self.rnd.choices(user_ids, cum_weights=weights)[0]
+                if author_id != user_id:
+                    authors.add(author_id)
+            follows.extend((user_id, author_id) for author_id in authors)
+        self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follows
+        ))
+        return follows
+
+    def power_law_weights(self, size, exponent=1.1):
+        """Накопленные веса Ципфа для random.choices."""
+        total = 0
+        weights = []
+        for rank in range(1, size + 1):
+            total += 1 / rank ** exponent
+            weights.append(total)
+        return weights
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.slowlog import read_entries, summarize
+
+
+class Command(BaseCommand):
+    help = ('Сводка по журналу медленных запросов: запросы, одинаковые '
+            'с точностью до значений, группируются и выводятся по убыванию '
+            'суммарного времени вместе с местами вызова и планом самого '
+            'медленного из них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--log', help='Файл журнала, по умолчанию SLOW_QUERY_LOG'
+        )
+
+    def handle(self, *args, **options):
+        groups = summarize(
+            read_entries(options['log'] or settings.SLOW_QUERY_LOG),
+            options['top']
+        )
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+            return
+        for number, group in enumerate(groups, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{number}. {group["count"]} раз, всего '
+                f'{group["total_ms"]:.1f} мс, максимум '
+                f'{group["max_ms"]:.1f} мс'
+            ))
+            self.stdout.write(group['sql'])
+            callers = sorted(group['callers'].items(),
+                             key=lambda item: -item[1])
+            for caller, count in callers[:3]:
+                self.stdout.write(f'  {count} x {caller}')
+            for line in group['plan'] or []:
+                self.stdout.write(f'  план: {line}')
@@ -0,0 +1,416 @@
+"""
+Метрики запросов по именам маршрутов в текстовом формате Prometheus.
+
+MetricsMiddleware на каждый запрос замеряет время ответа, число
+и время SQL-запросов (через execute_wrappers соединений) и размер
+ответа. Время рендера шаблонов замеряет шаблонный бэкенд
+MeteredTemplates, попадания и промахи кеша - обертка MeteredCache;
+оба подключаются в настройках TEMPLATES и CACHES. Числа копятся
+в словаре своего потока, поэтому на горячем пути нет блокировок;
+view metrics складывает словари всех потоков при чтении. Метрики
+живут в памяти процесса: при нескольких процессах сервера каждый
+отдает свои.
+"""
+import bisect
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.module_loading import import_string
+
+from . import tracing
+
+# Границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_local = threading.local()
+# Хранилища живых потоков. Хранилище принадлежит threading.local
+# потока и пропадает вместе с ним, а его счетчики переносятся
+# в _retired, чтобы не обнулять метрики при смене потоков сервера.
+_stores = weakref.WeakSet()
+_retired = {}
+_retired_lock = threading.Lock()
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'latency', 'statuses', 'queries', 'query_time',
+                 'render_time', 'cache_hits', 'cache_misses', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency = 0.0
+        self.statuses = {}
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+
+
+class RequestStats:
+    """Счетчики текущего запроса потока."""
+    __slots__ = ('queries', 'query_time', 'render_time', 'render_depth',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class ThreadStore:
+    """Счетчики маршрутов одного потока."""
+    __slots__ = ('routes', '__weakref__')
+
+    def __init__(self):
+        self.routes = {}
+
+
+def thread_store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = ThreadStore()
+        _stores.add(store)
+        weakref.finalize(store, retire, store.routes)
+    return store.routes
+
+
+def retire(routes):
+    """Переносит счетчики завершившегося потока в _retired."""
+    with _retired_lock:
+        merge(_retired, routes)
+
+
+def current():
+    """Счетчики запроса, который обслуживает поток, или None."""
+    return getattr(_local, 'request', None)
+
+
+def count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = current()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += time.perf_counter() - started
+
+
+def record(view, status, elapsed, size, stats):
+    routes = thread_store()
+    route = routes.get(view)
+    if route is None:
+        route = routes[view] = RouteStats()
+    route.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+    route.latency += elapsed
+    status_class = f'{status // 100}xx'
+    route.statuses[status_class] = route.statuses.get(status_class, 0) + 1
+    route.queries += stats.queries
+    route.query_time += stats.query_time
+    route.render_time += stats.render_time
+    route.cache_hits += stats.cache_hits
+    route.cache_misses += stats.cache_misses
+    route.bytes += size
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        stats = _local.request = RequestStats()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.request = None
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        status = response.status_code
+        if response.streaming:
+            # Тело потокового ответа отдается после выхода из view
+            # и без Content-Length: байты считаются по мере отдачи.
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                lambda size: record(view, status,
+                                    time.perf_counter() - started,
+                                    size, stats)
+            )
+        else:
+            record(view, status, time.perf_counter() - started,
+                   len(response.content), stats)
+        return response
+
+
+class MeasuredStream:
+    """
+    Итератор по телу потокового ответа, считает отданные байты.
+    done(size) вызывается один раз: в конце тела или при закрытии
+    ответа, если клиент ушел раньше.
+    """
+
+    def __init__(self, content, done):
+        self.content = iter(content)
+        self.done = done
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        done, self.done = self.done, None
+        if done is not None:
+            done(self.size)
+
+
+def install():
+    """
+    Подключает счетчик SQL-запросов. Обертка ставится на соединение
+    один раз, а не на каждый запрос: execute_wrapper с контекстным
+    менеджером стоит несколько микросекунд.
+    """
+    connection_created.connect(add_query_counter)
+    for conn in connections.all():
+        add_query_counter(connection=conn)
+
+
+def add_query_counter(sender=None, connection=None, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MeteredTemplate(Template):
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтен во внешнем рендере.
+        stats.render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.render_depth -= 1
+            if not stats.render_depth:
+                stats.render_time += time.perf_counter() - started
+
+
+class MeteredTemplates(DjangoTemplates):
+    """
+    Шаблонный бэкенд Django, который замеряет время рендера
+    в запросах под MetricsMiddleware.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        # Движок с теми же настройками, чьи шаблоны, в том числе
+        # {% include %}, пишут span'ы posts.tracing.
+        self.engine.__class__ = tracing.TracedEngine
+
+    def from_string(self, template_code):
+        return MeteredTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return MeteredTemplate(template.template, self)
+
+
+_missing = object()
+
+
+class MeteredCache:
+    """
+    Обертка над кешем, который задан в OPTIONS['BACKEND'], считает
+    попадания и промахи get и get_many и пишет span'ы posts.tracing.
+    Остальные вызовы передаются кешу как есть.
+    """
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = import_string(options.pop('BACKEND'))
+        params['OPTIONS'] = options
+        self.cache = backend(location, params)
+
+    def __getattr__(self, name):
+        # Методы конкретного бэкенда, например keys у django-redis.
+        return getattr(self.cache, name)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def get(self, key, default=None, version=None):
+        value = tracing.call('cache.get', 'cache', tracing.cache_key,
+                             self.cache.get, key, _missing, version)
+        stats = current()
+        if stats is not None:
+            if value is _missing:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = tracing.call('cache.get_many', 'cache', tracing.cache_key,
+                             self.cache.get_many, keys, version)
+        stats = current()
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+
+
+# Записи кеша, которые попадают в трассировку.
+TRACED_CACHE_METHODS = ('set', 'set_many', 'add', 'delete', 'delete_many',
+                        'incr')
+
+
+def delegate(name):
+    if name in TRACED_CACHE_METHODS:
+        def method(self, *args, **kwargs):
+            return tracing.call(f'cache.{name}', 'cache', tracing.cache_key,
+                                getattr(self.cache, name), *args, **kwargs)
+    else:
+        def method(self, *args, **kwargs):
+            return getattr(self.cache, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+# Методы BaseCache объявлены на классе явно, а не только через
+# __getattr__: так обертку видит getattr(type(cache), ...).
+for _name in ('add', 'set', 'touch', 'delete', 'get_or_set', 'has_key',
+              'incr', 'decr', 'set_many', 'delete_many', 'clear',
+              'incr_version', 'decr_version', 'make_key', 'validate_key',
+              'close'):
+    setattr(MeteredCache, _name, delegate(_name))
+
+
+def merge(total, routes):
+    """Прибавляет счетчики routes к total."""
+    for view, route in list(routes.items()):
+        summary = total.get(view)
+        if summary is None:
+            summary = total[view] = RouteStats()
+        for i, count in enumerate(route.buckets):
+            summary.buckets[i] += count
+        for status_class, count in list(route.statuses.items()):
+            summary.statuses[status_class] = (
+                summary.statuses.get(status_class, 0) + count
+            )
+        for name in ('latency', 'queries', 'query_time', 'render_time',
+                     'cache_hits', 'cache_misses', 'bytes'):
+            setattr(summary, name,
+                    getattr(summary, name) + getattr(route, name))
+
+
+def collect():
+    """Сумма счетчиков всех потоков по маршрутам."""
+    total = {}
+    with _retired_lock:
+        merge(total, _retired)
+    for store in list(_stores):
+        merge(total, store.routes)
+    return total
+
+
+def reset():
+    with _retired_lock:
+        _retired.clear()
+    for store in list(_stores):
+        store.routes.clear()
+
+
+def number(value):
+    return f'{value:.6f}' if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """Текст для Prometheus по данным collect()."""
+    routes = sorted(collect().items())
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    family(
+        'yatube_requests_total', 'counter',
+        'Ответы по маршрутам и классам статусов.',
+        [f'yatube_requests_total{{view="{view}",status="{status}"}} {count}'
+         for view, route in routes
+         for status, count in sorted(route.statuses.items())]
+    )
+    samples = []
+    for view, route in routes:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), route.buckets):
+            cumulative += count
+            samples.append(
+                f'yatube_request_duration_seconds_bucket'
+                f'{{view="{view}",le="{bound}"}} {cumulative}'
+            )
+        samples.append(f'yatube_request_duration_seconds_sum'
+                       f'{{view="{view}"}} {number(route.latency)}')
+        samples.append(f'yatube_request_duration_seconds_count'
+                       f'{{view="{view}"}} {cumulative}')
+    family('yatube_request_duration_seconds', 'histogram',
+           'Время ответа.', samples)
+    for name, attr, help_text in (
+        ('yatube_db_queries_total', 'queries', 'Число SQL-запросов.'),
+        ('yatube_db_query_seconds_total', 'query_time',
+         'Время SQL-запросов.'),
+        ('yatube_template_render_seconds_total', 'render_time',
+         'Время рендера шаблонов.'),
+        ('yatube_response_bytes_total', 'bytes', 'Размер ответов.'),
+    ):
+        family(name, 'counter', help_text, [
+            f'{name}{{view="{view}"}} {number(getattr(route, attr))}'
+            for view, route in routes
+        ])
+    family(
+        'yatube_cache_requests_total', 'counter',
+        'Чтения из кеша: hit - ключ найден, miss - нет.',
+        [f'yatube_cache_requests_total{{view="{view}",result="{result}"}} '
+         f'{count}'
+         for view, route in routes
+         for result, count in (('hit', route.cache_hits),
+                               ('miss', route.cache_misses))]
+    )
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """
+    Метрики процесса для Prometheus. Доступны с адресов
+    METRICS_ALLOWED_IPS и сотрудникам.
+    """
+    if (request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+            and not request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
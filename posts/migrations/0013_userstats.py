@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+
+    def count_by(queryset, field):
+        return dict(
+            queryset.order_by().values(field)
+            .annotate(total=models.Count('id'))
+            .values_list(field, 'total')
+        )
+
+    follower = count_by(Follow.objects.filter(author__isnull=False), 'user')
+    following = count_by(Follow.objects.filter(user__isnull=False), 'author')
+    posts = count_by(Post.objects.all(), 'author')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id,
+                   follower_count=follower.get(user_id, 0),
+                   following_count=following.get(user_id, 0),
+                   post_count=posts.get(user_id, 0))
+         for user_id in User.objects.values_list('id', flat=True)),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('follower_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,207 @@
+import functools
+import re
+import sqlite3
+
+from django.db import migrations
+
+# Имена таблиц и стеммер скопированы из posts.search и posts.stemmer
+# на момент миграции: их дальнейшие изменения не должны менять то,
+# что делает эта миграция.
+POST_TABLE = 'posts_post_fts'
+COMMENT_TABLE = 'posts_comment_fts'
+BATCH_SIZE = 5000
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', True), ('вши', True), ('в', True),
+    ('ившись', False), ('ывшись', False), ('ивши', False),
+    ('ывши', False), ('ив', False), ('ыв', False),
+)
+ADJECTIVE = tuple((ending, False) for ending in (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', True), ('нн', True), ('вш', True), ('ющ', True), ('щ', True),
+    ('ивш', False), ('ывш', False), ('ующ', False),
+)
+REFLEXIVE = (('ся', False), ('сь', False))
+VERB = tuple((ending, True) for ending in (
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+)) + tuple((ending, False) for ending in (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+))
+NOUN = tuple((ending, False) for ending in (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _by_length(endings):
+    return tuple(sorted(endings, key=lambda item: -len(item[0])))
+
+
+PERFECTIVE_GERUND = _by_length(PERFECTIVE_GERUND)
+ADJECTIVE = _by_length(ADJECTIVE)
+PARTICIPLE = _by_length(PARTICIPLE)
+REFLEXIVE = _by_length(REFLEXIVE)
+VERB = _by_length(VERB)
+NOUN = _by_length(NOUN)
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i - 1] in VOWELS and word[i] not in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    return rv, next_region(r1)
+
+
+def _strip(word, start, endings):
+    """
+    Отрезает самое длинное окончание из endings, лежащее в области
+    с началом start. Окончаниям с флагом нужна предшествующая а или я.
+    Возвращает None, если ничего не отрезано.
+    """
+    for ending, after_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if after_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return None
+        return word[:cut]
+    return None
+
+
+@functools.lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1.
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = _strip(word, rv, ADJECTIVE)
+        if stripped is not None:
+            word = _strip(stripped, rv, PARTICIPLE) or stripped
+        else:
+            stripped = _strip(word, rv, VERB)
+            if stripped is None:
+                stripped = _strip(word, rv, NOUN)
+            if stripped is not None:
+                word = stripped
+
+    # Шаг 2.
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3.
+    word = _strip(word, r2, (('ость', False), ('ост', False))) or word
+
+    # Шаг 4.
+    stripped = _strip(word, rv, (('ейше', False), ('ейш', False)))
+    if stripped is not None:
+        word = stripped
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif stripped is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    return ' '.join(stem(word) for word in WORD_RE.findall(text.lower()))
+
+
+def fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE probe USING fts5(body)'
+        )
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite' or not fts5_available():
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_TABLE} '
+            f"USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_TABLE} '
+            f'USING fts5(body, post_id UNINDEXED, '
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        last_pk = 0
+        while True:
+            rows = list(Post.objects.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', 'text')[:BATCH_SIZE])
+            if not rows:
+                break
+            cursor.executemany(
+                f'INSERT INTO {POST_TABLE}(rowid, body) VALUES (%s, %s)',
+                [(pk, stem_text(text)) for pk, text in rows]
+            )
+            last_pk = rows[-1][0]
+        last_pk = 0
+        while True:
+            rows = list(Comment.objects.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', 'post_id', 'text')[:BATCH_SIZE])
+            if not rows:
+                break
+            cursor.executemany(
+                f'INSERT INTO {COMMENT_TABLE}(rowid, body, post_id) '
+                f'VALUES (%s, %s, %s)',
+                [(pk, stem_text(text), post_id)
+                 for pk, post_id, text in rows]
+            )
+            last_pk = rows[-1][0]
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {POST_TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {COMMENT_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_userstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
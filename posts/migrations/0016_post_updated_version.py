@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    """Оставляет самую раннюю из одинаковых подписок."""
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = Follow.objects.filter(
+        user__isnull=False, author__isnull=False
+    ).order_by().values('user', 'author').annotate(
+        first_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates.iterator():
+        Follow.objects.filter(
+            user_id=row['user'], author_id=row['author']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_updated_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='fanout_pull',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,5 +1,9 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -13,6 +17,37 @@ class Group(models.Model):
         return self.title
 
 
+def comment_count_subquery(post_ref):
+    comments = Comment.objects.filter(
+        post=models.OuterRef(post_ref)
+    ).order_by().values('post').annotate(
+        total=models.Count('id')
+    ).values('total')
+    return Coalesce(models.Subquery(comments), 0)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Посты для вывода карточками post_item.html:
+        автор и группа подгружаются join-ом, число комментариев
+        считается подзапросом в том же запросе. Подзапрос выполняется
+        только для строк страницы, в отличие от GROUP BY по всей ленте.
+        """
+        return self.select_related('author', 'group').annotate(
+            comment_count=comment_count_subquery('pk')
+        ).order_by('-pub_date', '-id')
+
+    def bump_version(self, **fields):
+        """
+        Сбрасывает закешированные карточки постов: новая версия
+        дает новый ключ фрагмента в post_item.html, а время изменения
+        попадает в Last-Modified страниц. fields обновляются тем же UPDATE.
+        """
+        return self.update(updated_version=models.F('updated_version') + 1,
+                           updated=timezone.now(), **fields)
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст записи',
                             help_text=('Здесь находится текст'
@@ -27,9 +62,22 @@ class Post(models.Model):
                                          ' нужно опубликовать запись'))
     image = models.ImageField(upload_to='posts/', blank=True, null=True,
                               verbose_name='Картинка')
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+    updated_version = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField('date updated', auto_now=True)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -45,6 +93,13 @@ class Comment(models.Model):
                                        ' свой комментарий'))
     created = models.DateTimeField('date published', auto_now_add=True)
 
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return self.text[:10]
 
@@ -54,3 +109,114 @@ class Follow(models.Model):
                              related_name='follower', null=True)
     author = models.ForeignKey(User, on_delete=models.SET_NULL,
                                related_name='following', null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow')
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: строка на пару (читатель, пост).
+    Заполняется при публикации поста (fan-out on write),
+    pub_date дублируется из поста, чтобы лента читалась по индексу.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx')
+        ]
+
+
+class UserStats(models.Model):
+    """
+    Денормализованные счетчики для карточки профиля.
+    Имена полей повторяют related_name связей:
+    follower_count - число записей user.follower (на кого подписан),
+    following_count - число записей user.following (подписчики).
+    fanout_pull - посты автора подмешиваются в ленты при чтении
+    (см. posts.feeds.sync_pull_authors).
+    Поддерживаются сигналами, сверяются командой rebuild_user_stats.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0,
+                                                  db_index=True)
+    post_count = models.PositiveIntegerField(default=0)
+    fanout_pull = models.BooleanField(default=False)
+
+    COUNTERS = ('follower_count', 'following_count', 'post_count')
+
+    def __str__(self):
+        return f'Статистика {self.user_id}'
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Счетчики пользователя. Если строки еще нет, она создается
+        по честным COUNT-запросам.
+        """
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            stats, _ = cls.objects.get_or_create(
+                user=user,
+                # Те же условия, что и в rebuild_user_stats: подписки
+                # без второй стороны не считаются.
+                defaults={
+                    'follower_count': user.follower.filter(
+                        author__isnull=False
+                    ).count(),
+                    'following_count': user.following.filter(
+                        user__isnull=False
+                    ).count(),
+                    'post_count': user.posts.count()
+                }
+            )
+            return stats
+
+    @classmethod
+    def bump(cls, user_id, field, delta):
+        """
+        Атомарно меняет счетчик одним UPDATE с F-выражением.
+        Отсутствующая строка будет посчитана заново в for_user.
+        """
+        if user_id is None:
+            return
+        queryset = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        queryset.update(**{field: models.F(field) + delta})
+
+    @classmethod
+    def bump_many(cls, field, deltas):
+        """
+        Прибавляет к счетчику field разных пользователей, deltas -
+        словарь {user_id: прибавка}. Пользователи группируются по
+        прибавке: один UPDATE на каждое значение, а не на пользователя.
+        """
+        users = defaultdict(list)
+        for user_id, delta in deltas.items():
+            if user_id is not None and delta:
+                users[delta].append(user_id)
+        for delta, user_ids in users.items():
+            cls.objects.filter(user_id__in=user_ids).update(
+                **{field: models.F(field) + delta}
+            )
+
+    def as_counters(self):
+        return {field: getattr(self, field) for field in self.COUNTERS}
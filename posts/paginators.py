@@ -0,0 +1,173 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Сколько номеров страниц показывать вокруг текущей в панели паджинатора.
+PAGE_WINDOW = 10
+# Границы id в курсоре: знаковое 64-битное целое.
+MIN_ID, MAX_ID = -2 ** 63, 2 ** 63 - 1
+
+
+class CursorPaginator:
+    """
+    Keyset-паджинатор для лент постов.
+    Вместо номера страницы принимает непрозрачные токены ?after=/?before=,
+    ключом выступает пара (date_field, id), по умолчанию (pub_date, id)
+    от новых записей к старым. COUNT(*) и OFFSET не выполняются,
+    поэтому любая страница ленты стоит столько же, сколько первая.
+    """
+
+    date_field = 'pub_date'
+    newest_first = True
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def cursor_key(self, obj):
+        """Пара (дата, id) записи: модели или словаря из values()."""
+        if isinstance(obj, dict):
+            return obj[self.date_field], obj['id']
+        return getattr(obj, self.date_field), obj.pk
+
+    def encode_cursor(self, obj):
+        date, pk = self.cursor_key(obj)
+        raw = f'{date.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        """
+        Возвращает пару (дата, id) или None, если токен испорчен.
+        Дата с часовым поясом (USE_TZ выключен) и id вне 64-битного
+        целого, которое не примет база, тоже считаются порчей.
+        """
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            date, pk = raw.decode().split('|')
+            date, pk = datetime.fromisoformat(date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if date.tzinfo is not None or not MIN_ID <= pk <= MAX_ID:
+            return None
+        return date, pk
+
+    def cursor_filter(self, key, backwards, date_field=None, id_field='id'):
+        """
+        Условие на записи строго после позиции key в порядке ленты
+        (или строго до нее, если backwards).
+        """
+        date_field = date_field or self.date_field
+        date, pk = key
+        lookup = 'gt' if backwards == self.newest_first else 'lt'
+        return (Q(**{f'{date_field}__{lookup}': date})
+                | Q(**{date_field: date, f'{id_field}__{lookup}': pk}))
+
+    def cursor_ordering(self, backwards, date_field=None, id_field='id'):
+        date_field = date_field or self.date_field
+        if backwards == self.newest_first:
+            return date_field, id_field
+        return f'-{date_field}', f'-{id_field}'
+
+    def fetch(self, key, backwards, limit):
+        """
+        Выбирает не более limit записей после позиции key.
+        При backwards выборка идет в обратную сторону.
+        """
+        queryset = self.object_list
+        if key:
+            queryset = queryset.filter(self.cursor_filter(key, backwards))
+        queryset = queryset.order_by(*self.cursor_ordering(backwards))
+        return list(queryset[:limit])
+
+    def get_page(self, after=None, before=None):
+        """
+        Возвращает страницу после (или до) позиции из токена.
+        Некорректный токен отдает первую страницу, как Paginator.get_page.
+
+        Для совместимости с шаблонами возвращается обычный Page,
+        дополненный атрибутами cursor, next_cursor и previous_cursor.
+        Его paginator ленивый и COUNT(*) не выполняет, пока
+        к нему не обратятся явно.
+        """
+        after_key = self.decode_cursor(after)
+        before_key = None if after_key else self.decode_cursor(before)
+
+        if before_key:
+            items = self.fetch(before_key, True, self.per_page + 1)
+        else:
+            items = self.fetch(after_key, False, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+
+        if before_key:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after_key is not None
+
+        page = Page(items, 1, Paginator(self.object_list, self.per_page))
+        page.cursor = after if after_key else (before if before_key else '')
+        page.next_cursor = (
+            self.encode_cursor(items[-1]) if has_next and items else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(items[0]) if has_previous and items else None
+        )
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    """
+    Комментарии поста порциями от старых к новым,
+    ключ курсора - пара (created, id).
+    """
+    date_field = 'created'
+    newest_first = False
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator с заранее известным числом записей, например
+    из счетчика UserStats.post_count, который ведут сигналы Post.
+    COUNT(*) не выполняется; если count равен None, число записей
+    считается как обычно.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is None:
+            return super().count
+        return self.known_count
+
+    def _get_page(self, object_list, number, paginator):
+        """
+        Как и у CursorPaginator, страница ссылается на обычный
+        Paginator, поэтому шаблоны и проверки контекста не меняются.
+        Число записей ему передается готовым.
+        """
+        plain = Paginator(self.object_list, self.per_page, self.orphans,
+                          self.allow_empty_first_page)
+        plain.count = self.count
+        return Page(object_list, number, plain)
+
+
+def page_window(page, size=PAGE_WINDOW):
+    """
+    Номера страниц для панели: около size номеров вокруг текущей,
+    первая и последняя страницы, пропуски обозначены
+    Paginator.ELLIPSIS. Длина не зависит от числа страниц.
+    """
+    return page.paginator.get_elided_page_range(
+        page.number, on_each_side=size // 2, on_ends=1
+    )
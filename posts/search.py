@@ -0,0 +1,372 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На SQLite используется FTS5: таблицы posts_post_fts и posts_comment_fts
+хранят тексты, уже пропущенные через русский стеммер, ранжирование
+выполняет bm25(). На других СУБД работает инвертированный индекс
+в памяти процесса с тем же стеммингом и ранжированием BM25.
+Индексы обновляются сигналами save/delete моделей Post и Comment.
+Сигналы видны только своему процессу, поэтому индекс в памяти, как
+и граф подписок, раз в SEARCH_INDEX_TTL секунд перестраивается из базы.
+"""
+import bisect
+import functools
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .stemmer import stem, stem_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+POST_TABLE = 'posts_post_fts'
+COMMENT_TABLE = 'posts_comment_fts'
+MAX_TERMS = 10
+REBUILD_BATCH_SIZE = 5000
+
+
+def parse_query(query):
+    """
+    Основы слов запроса. Последнее слово ищется по префиксу,
+    чтобы поиск работал по мере набора.
+    """
+    terms = [(stem(word), False) for word in tokenize(query)[:MAX_TERMS]]
+    if terms:
+        terms[-1] = (terms[-1][0], True)
+    return terms
+
+
+def in_batches(queryset, size=REBUILD_BATCH_SIZE):
+    """Объекты queryset пачками по возрастанию pk."""
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+class SqliteSearchBackend:
+
+    def rebuild(self):
+        from .models import Comment, Post
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POST_TABLE}')
+            cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        for posts in in_batches(Post.objects.only('text')):
+            self.index_posts(posts)
+        for comments in in_batches(Comment.objects.only('post_id', 'text')):
+            self.index_comments(comments)
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {POST_TABLE}(rowid, body) '
+                f'VALUES (%s, %s)', [post.pk, stem_text(post.text)]
+            )
+
+    def index_posts(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {POST_TABLE}(rowid, body) '
+                f'VALUES (%s, %s)',
+                [(post.pk, stem_text(post.text)) for post in posts]
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+    def index_comment(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {COMMENT_TABLE}'
+                f'(rowid, body, post_id) VALUES (%s, %s, %s)',
+                [comment.pk, stem_text(comment.text), comment.post_id]
+            )
+
+    def index_comments(self, comments):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {COMMENT_TABLE}'
+                f'(rowid, body, post_id) VALUES (%s, %s, %s)',
+                [(comment.pk, stem_text(comment.text), comment.post_id)
+                 for comment in comments]
+            )
+
+    def remove_comment(self, comment_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s',
+                           [comment_id])
+
+    def search(self, query, offset, limit):
+        """id постов по убыванию релевантности."""
+        terms = parse_query(query)
+        if not terms:
+            return []
+        match = ' '.join(
+            '"{}"{}'.format(term.replace('"', ''), '*' if prefix else '')
+            for term, prefix in terms
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM ('
+                f'  SELECT rowid AS post_id, bm25({POST_TABLE}) AS score'
+                f'  FROM {POST_TABLE} WHERE {POST_TABLE} MATCH %s'
+                f'  UNION ALL'
+                f'  SELECT post_id, bm25({COMMENT_TABLE}) * 0.5 AS score'
+                f'  FROM {COMMENT_TABLE} WHERE {COMMENT_TABLE} MATCH %s'
+                f') GROUP BY post_id ORDER BY MIN(score), post_id DESC '
+                f'LIMIT %s OFFSET %s',
+                [match, match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MemorySearchBackend:
+    """
+    Инвертированный индекс в памяти процесса: основа слова -> {id: tf}.
+    Строится из базы при первом поиске и перестраивается раз
+    в SEARCH_INDEX_TTL секунд, чтобы найти посты и комментарии,
+    сохраненные другими процессами. Перестройка идет так же, как
+    у графа подписок (posts.graph): новый индекс строится без
+    блокировки, подменяется под ней, а изменения, пришедшие во время
+    построения, повторяются поверх него.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.built_at = 0
+        self.building = False
+        self.pending = []
+        self.reset()
+
+    def reset(self):
+        self.ready = False
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.lengths = {}
+        self.total_length = 0
+        self.doc_terms = {}
+
+    def rebuild(self):
+        """Индекс будет заново построен из базы при следующем поиске."""
+        with self.lock:
+            self.reset()
+
+    def build(self):
+        from .models import Comment, Post
+
+        for pk, text in Post.objects.values_list('pk', 'text').iterator():
+            self.add(('post', pk), pk, text)
+        for pk, post_id, text in Comment.objects.values_list(
+                'pk', 'post_id', 'text').iterator():
+            self.add(('comment', pk), post_id, text)
+        self.terms = sorted(self.postings)
+        self.ready = True
+
+    def swap(self, staging):
+        """
+        Берет построенный индекс и повторяет поверх него изменения,
+        пришедшие во время построения.
+        """
+        with self.lock:
+            self.postings = staging.postings
+            self.terms = staging.terms
+            self.lengths = staging.lengths
+            self.total_length = staging.total_length
+            self.doc_terms = staging.doc_terms
+            self.ready = True
+            pending, self.pending = self.pending, []
+            for change, args in pending:
+                change(*args)
+
+    def refresh(self, background):
+        """Запускает перестройку, если она еще не идет."""
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+            self.pending = []
+        if background:
+            threading.Thread(target=self.run_build, args=(True,),
+                             name='search-index', daemon=True).start()
+        else:
+            self.run_build(False)
+
+    def run_build(self, background):
+        try:
+            staging = MemorySearchBackend()
+            staging.build()
+            self.swap(staging)
+        except Exception:
+            logger.exception('Не удалось построить поисковый индекс')
+        finally:
+            with self.lock:
+                self.building = False
+                self.pending = []
+                # Неудачная перестройка повторяется не чаще раза в TTL.
+                self.built_at = time.monotonic()
+            if background:
+                connection.close()
+
+    def ensure_ready(self):
+        """
+        Первый поиск ждет построения индекса, устаревший индекс
+        перестраивается в фоне (SEARCH_INDEX_BACKGROUND), а поиск идет
+        по текущему.
+        """
+        if not self.ready:
+            with self.build_lock:
+                if not self.ready:
+                    self.refresh(background=False)
+            return
+        ttl = settings.SEARCH_INDEX_TTL
+        if ttl is not None and time.monotonic() - self.built_at > ttl:
+            self.refresh(settings.SEARCH_INDEX_BACKGROUND)
+
+    def add(self, key, post_id, text):
+        self.discard(key)
+        stems = [stem(word) for word in tokenize(text)]
+        counts = defaultdict(int)
+        for term in stems:
+            counts[term] += 1
+        for term, count in counts.items():
+            if self.ready and term not in self.postings:
+                bisect.insort(self.terms, term)
+            self.postings[term][key] = count
+        self.lengths[key] = len(stems)
+        self.total_length += len(stems)
+        self.doc_terms[key] = (post_id, tuple(counts))
+
+    def discard(self, key):
+        _, terms = self.doc_terms.pop(key, (None, ()))
+        self.total_length -= self.lengths.pop(key, 0)
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect.bisect_left(self.terms, term)
+                if index < len(self.terms) and self.terms[index] == term:
+                    del self.terms[index]
+
+    def apply(self, change, *args):
+        """
+        Применяет изменение к текущему индексу и запоминает его, если
+        идет перестройка: новый индекс мог прочитать базу раньше.
+        """
+        with self.lock:
+            if self.building:
+                self.pending.append((change, args))
+            if self.ready:
+                change(*args)
+
+    def update(self, key, post_id, text):
+        self.apply(self.add, key, post_id, text)
+
+    def delete(self, key):
+        self.apply(self.discard, key)
+
+    def index_post(self, post):
+        self.update(('post', post.pk), post.pk, post.text)
+
+    def remove_post(self, post_id):
+        self.delete(('post', post_id))
+
+    def index_comment(self, comment):
+        self.update(('comment', comment.pk), comment.post_id, comment.text)
+
+    def remove_comment(self, comment_id):
+        self.delete(('comment', comment_id))
+
+    def index_posts(self, posts):
+        for post in posts:
+            self.index_post(post)
+
+    def index_comments(self, comments):
+        for comment in comments:
+            self.index_comment(comment)
+
+    def expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+        start = bisect.bisect_left(self.terms, term)
+        end = bisect.bisect_left(self.terms, term + '\uffff')
+        return self.terms[start:end]
+
+    def search(self, query, offset, limit):
+        terms = parse_query(query)
+        if not terms:
+            return []
+        self.ensure_ready()
+        with self.lock:
+            total = len(self.lengths) or 1
+            average = self.total_length / total or 1
+            scores = None
+            for term, prefix in terms:
+                term_scores = defaultdict(float)
+                for word in self.expand(term, prefix):
+                    postings = self.postings[word]
+                    idf = math.log(
+                        1 + (total - len(postings) + 0.5)
+                        / (len(postings) + 0.5)
+                    )
+                    for key, count in postings.items():
+                        norm = self.k1 * (
+                            1 - self.b + self.b * self.lengths[key] / average
+                        )
+                        weight = 1 if key[0] == 'post' else 0.5
+                        post_id = self.doc_terms[key][0]
+                        term_scores[post_id] += weight * idf * (
+                            count * (self.k1 + 1) / (count + norm)
+                        )
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {post_id: score + term_scores[post_id]
+                              for post_id, score in scores.items()
+                              if post_id in term_scores}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [post_id for post_id, _ in ranked[offset:offset + limit]]
+
+
+_memory_backend = MemorySearchBackend()
+
+
+@functools.lru_cache(maxsize=None)
+def fts5_available():
+    """Собран ли модуль sqlite3 с поддержкой FTS5."""
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE probe USING fts5(body)'
+        )
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def rebuild_index():
+    """
+    Заново индексирует все посты и комментарии, например после
+    bulk_create, который не вызывает сигналов.
+    """
+    get_backend().rebuild()
+
+
+def get_backend():
+    if connection.vendor == 'sqlite' and fts5_available():
+        return SqliteSearchBackend()
+    return _memory_backend
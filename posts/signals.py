@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import authors, feeds, graph, search, tasks
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=User)
+def remember_author_card(sender, instance, **kwargs):
+    instance._author_card = authors.card_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def forget_changed_author(sender, instance, created, **kwargs):
+    # Вход пользователя меняет только last_login, карточка остается.
+    old = getattr(instance, '_author_card', None)
+    new = authors.card_fields(instance)
+    if created or old != new:
+        authors.forget_authors(old and old[1], instance.username)
+    if not created and old and old[1] != instance.username:
+        # Карточки постов и валидаторы лент показывают имя автора.
+        Post.objects.filter(author_id=instance.pk).bump_version()
+    instance._author_card = new
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_author(sender, instance, **kwargs):
+    authors.forget_authors(instance.username)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.author_id, 'post_count', 1)
+        feeds.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        UserStats.bump(instance.user_id, 'follower_count', 1)
+        UserStats.bump(instance.author_id, 'following_count', 1)
+        feeds.backfill_timeline(instance.user_id, instance.author_id)
+        graph.add_follows(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline_on_unfollow(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        UserStats.bump(instance.user_id, 'follower_count', -1)
+        UserStats.bump(instance.author_id, 'following_count', -1)
+        feeds.drop_from_timeline(instance.user_id, instance.author_id)
+        graph.remove_follows(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=User)
+def drop_user_from_graph(sender, instance, **kwargs):
+    # Подписки на удаленного автора обнуляются через SET_NULL
+    # без сигналов, поэтому пользователь убирается из графа целиком.
+    graph.remove_user(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.get_backend().index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.get_backend().remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, **kwargs):
+    if tasks.thumbnails_outdated(instance):
+        transaction.on_commit(
+            lambda: tasks.generate_thumbnails.delay(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Post)
+def bump_edited_post_version(sender, instance, created, **kwargs):
+    if not created:
+        Post.objects.filter(pk=instance.pk).bump_version()
+        instance.refresh_from_db(fields=['updated_version'])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post_version(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).bump_version()
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group_posts_version(sender, instance, **kwargs):
+    # При удалении группы посты еще нужно найти до SET_NULL.
+    Post.objects.filter(group=instance).bump_version()
@@ -0,0 +1,186 @@
+"""
+Журнал медленных SQL-запросов.
+
+Обертка выполнения запросов (execute_wrappers соединения) замеряет
+каждый запрос. Если он дольше SLOW_QUERY_MS миллисекунд, в логгер
+posts.slow_queries пишется JSON-строка: SQL, параметры, время, место
+вызова в коде проекта и строка шаблона, при рендере которого запрос
+выполнен, а также план из EXPLAIN QUERY PLAN. Логгер настроен
+в LOGGING на ротируемый файл SLOW_QUERY_LOG, сводку по нему печатает
+команда slow_queries. Журнал включается заданием SLOW_QUERY_MS,
+по умолчанию обертка не ставится.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('posts.slow_queries')
+
+MAX_PARAMS_LENGTH = 500
+_local = threading.local()
+# Кадры этих модулей не считаются местом вызова: это обертки
+# выполнения запросов.
+_skipped_files = tuple(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('slowlog.py', 'metrics.py', 'tracing.py')
+)
+_project_dir = os.path.abspath(settings.BASE_DIR) + os.sep
+_libraries = (os.sep + 'site-packages' + os.sep,
+              os.sep + 'dist-packages' + os.sep)
+# Сколько кадров кода проекта сохранять, от ближайшего к запросу.
+STACK_DEPTH = 5
+
+
+def is_project_frame(filename):
+    return (filename.startswith(_project_dir)
+            and filename not in _skipped_files
+            and not any(part in filename for part in _libraries))
+
+
+def find_callers(frame):
+    """
+    Кадры кода проекта на стеке (строки вида
+    'posts/views.py:42 post_view', ближайший первым) и ближайший узел
+    шаблона, например 'posts/post_item.html:12'.
+    """
+    stack = []
+    template = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if len(stack) < STACK_DEPTH and is_project_frame(filename):
+            stack.append('{}:{} {}'.format(
+                os.path.relpath(filename, _project_dir),
+                frame.f_lineno, frame.f_code.co_name
+            ))
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return stack, template
+
+
+def explain(connection, sql, params):
+    """
+    План запроса; запросы самого EXPLAIN в журнал не попадают.
+    Внутри atomic EXPLAIN выполняется в точке сохранения: его ошибка
+    на PostgreSQL иначе сломала бы транзакцию вызывающего кода.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+              else 'EXPLAIN')
+    savepoint = (transaction.atomic(using=connection.alias)
+                 if connection.in_atomic_block else nullcontext())
+    _local.explaining = True
+    try:
+        with savepoint, connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN не выполнен: {error}']
+    finally:
+        _local.explaining = False
+
+
+def log_slow_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = (time.perf_counter() - started) * 1000
+    threshold = settings.SLOW_QUERY_MS
+    if (threshold is None or elapsed < threshold
+            or getattr(_local, 'explaining', False)):
+        return result
+    stack, template = find_callers(sys._getframe(1))
+    logger.warning(json.dumps({
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration_ms': round(elapsed, 3),
+        'sql': sql,
+        'params': repr(params)[:MAX_PARAMS_LENGTH],
+        'many': many,
+        'caller': stack[0] if stack else None,
+        'stack': stack,
+        'template': template,
+        'plan': None if many else explain(context['connection'], sql,
+                                          params),
+    }, ensure_ascii=False, default=str))
+    return result
+
+
+def add_slow_query_log(sender=None, connection=None, **kwargs):
+    if log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_slow_query)
+
+
+def install():
+    """Ставит обертку на соединения. Вызывается из PostsConfig.ready."""
+    connection_created.connect(add_slow_query_log)
+    for connection in connections.all():
+        add_slow_query_log(connection=connection)
+
+
+_placeholders = re.compile(r'%s(?:\s*,\s*%s)+')
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize(sql):
+    """SQL без литералов и с одним плейсхолдером вместо списков IN."""
+    return _placeholders.sub('%s, ...', _literals.sub('?', sql))
+
+
+def read_entries(path):
+    """Записи журнала и его ротированных копий, от старых к новым."""
+    paths = [path]
+    number = 1
+    while os.path.exists(f'{path}.{number}'):
+        paths.insert(0, f'{path}.{number}')
+        number += 1
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries, top=10):
+    """
+    Группирует записи по нормализованному SQL и возвращает top
+    групп по суммарному времени.
+    """
+    groups = {}
+    for entry in entries:
+        sql = normalize(entry['sql'])
+        group = groups.setdefault(sql, {
+            'sql': sql,
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'callers': {},
+            'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['plan'] = entry.get('plan')
+        caller = ' / '.join(filter(None, (entry.get('caller'),
+                                          entry.get('template'))))
+        if caller:
+            group['callers'][caller] = group['callers'].get(caller, 0) + 1
+    return sorted(groups.values(), key=lambda group: -group['total_ms'])[:top]
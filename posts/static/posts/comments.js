@@ -0,0 +1,24 @@
+// Кнопка "Показать еще комментарии": следующая порция приходит
+// HTML-фрагментом и встает на место кнопки. Без JS кнопка остается
+// обычной ссылкой на страницу поста с курсором.
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('.js-more-comments');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.dataset.url, {credentials: 'same-origin'})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            link.insertAdjacentHTML('afterend', html);
+            link.remove();
+        })
+        .catch(function () {
+            window.location = link.href;
+        });
+});
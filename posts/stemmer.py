@@ -0,0 +1,140 @@
+"""
+Стеммер русского языка по алгоритму Snowball
+(https://snowballstem.org/algorithms/russian/stemmer.html).
+Используется поисковым индексом, чтобы "котами" и "кот" находили
+одни и те же записи.
+"""
+import functools
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', True), ('вши', True), ('в', True),
+    ('ившись', False), ('ывшись', False), ('ивши', False),
+    ('ывши', False), ('ив', False), ('ыв', False),
+)
+ADJECTIVE = tuple((ending, False) for ending in (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', True), ('нн', True), ('вш', True), ('ющ', True), ('щ', True),
+    ('ивш', False), ('ывш', False), ('ующ', False),
+)
+REFLEXIVE = (('ся', False), ('сь', False))
+VERB = tuple((ending, True) for ending in (
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+)) + tuple((ending, False) for ending in (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+))
+NOUN = tuple((ending, False) for ending in (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _by_length(endings):
+    return tuple(sorted(endings, key=lambda item: -len(item[0])))
+
+
+PERFECTIVE_GERUND = _by_length(PERFECTIVE_GERUND)
+ADJECTIVE = _by_length(ADJECTIVE)
+PARTICIPLE = _by_length(PARTICIPLE)
+REFLEXIVE = _by_length(REFLEXIVE)
+VERB = _by_length(VERB)
+NOUN = _by_length(NOUN)
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i - 1] in VOWELS and word[i] not in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    return rv, next_region(r1)
+
+
+def _strip(word, start, endings):
+    """
+    Отрезает самое длинное окончание из endings, лежащее в области
+    с началом start. Окончаниям с флагом нужна предшествующая а или я.
+    Возвращает None, если ничего не отрезано.
+    """
+    for ending, after_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if after_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return None
+        return word[:cut]
+    return None
+
+
+# Слова в текстах повторяются, кеш избавляет от повторного разбора
+# при индексации больших объемов.
+@functools.lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1.
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = _strip(word, rv, ADJECTIVE)
+        if stripped is not None:
+            word = _strip(stripped, rv, PARTICIPLE) or stripped
+        else:
+            stripped = _strip(word, rv, VERB)
+            if stripped is None:
+                stripped = _strip(word, rv, NOUN)
+            if stripped is not None:
+                word = stripped
+
+    # Шаг 2.
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3.
+    word = _strip(word, r2, (('ость', False), ('ост', False))) or word
+
+    # Шаг 4.
+    stripped = _strip(word, rv, (('ейше', False), ('ейш', False)))
+    if stripped is not None:
+        word = stripped
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif stripped is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре."""
+    return WORD_RE.findall(text.lower())
+
+
+def stem_text(text):
+    return ' '.join(stem(word) for word in tokenize(text))
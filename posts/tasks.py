@@ -0,0 +1,71 @@
+import logging
+
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from . import feeds, images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnails_outdated(post):
+    """
+    Копии картинки не готовы, сделаны для другой картинки
+    или по старым настройкам.
+    """
+    if not post.image:
+        return bool(post.thumbnails)
+    return (post.thumbnails.get('source') != post.image.name
+            or post.thumbnails.get('profile') != images.profile())
+
+
+def delete_variants(thumbnails, keep=()):
+    for variant in thumbnails.get('variants', ()):
+        if variant['name'] not in keep:
+            default_storage.delete(variant['name'])
+
+
+@shared_task
+def generate_thumbnails(post_id):
+    """
+    Готовит адаптивные копии картинки поста и сохраняет их адреса
+    и размеры в Post.thumbnails, чтобы шаблоны не трогали сам файл.
+    """
+    post = Post.objects.filter(pk=post_id).only('image', 'thumbnails').first()
+    if post is None:
+        return
+    if not post.image:
+        Post.objects.filter(pk=post_id).bump_version(thumbnails={})
+        delete_variants(post.thumbnails)
+        return
+
+    try:
+        thumbnails = images.build_derivatives(post)
+    except Exception:
+        # Битый или недоступный файл не должен ронять запрос
+        # в режиме eager: пост остается с исходной картинкой.
+        logger.exception('Не удалось сделать миниатюры поста %s', post_id)
+        return
+    updated = Post.objects.filter(
+        pk=post_id, image=post.image.name
+    ).bump_version(thumbnails=thumbnails)
+    if updated:
+        delete_variants(post.thumbnails, keep={
+            variant['name'] for variant in thumbnails['variants']
+        })
+    else:
+        # Картинку успели заменить, копии для нее уже не нужны.
+        delete_variants(thumbnails)
+
+
+@shared_task
+def backfill_timelines(user_id, author_ids):
+    """Заполняет ленту пользователя постами новых подписок."""
+    feeds.backfill_authors(user_id, author_ids)
+
+
+@shared_task
+def refill_follower_timelines(author_id):
+    """Дозаполняет ленты подписчиков автора, вернувшегося к раскладке."""
+    feeds.refill_followers(author_id)
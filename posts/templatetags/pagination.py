@@ -0,0 +1,14 @@
+from django import template
+
+from posts.paginators import page_window as window
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page):
+    """
+    Номера страниц для paginator.html вместо paginator.page_range,
+    который для большой ленты выводит ссылку на каждую страницу.
+    """
+    return window(page)
@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, sizes=''):
+    """
+    Карточки постов одним тегом вместо {% for %} с {% include %}:
+    шаблон posts/post_item.html находится и компилируется один раз
+    на вызов, а не разбирается узлом include на каждой итерации.
+    """
+    item = context.template.engine.get_template('posts/post_item.html')
+    parts = []
+    with context.push(sizes=sizes):
+        for post in posts:
+            context['post'] = post
+            parts.append(item.render(context))
+    return mark_safe(''.join(parts))
@@ -0,0 +1,83 @@
+"""
+Замер стоимости страниц: число SQL-запросов, их время,
+время ответа и размер отданного HTML.
+Используется тестами бюджетов, отчет сохраняется в JSON,
+чтобы сравнивать результаты между коммитами.
+"""
+import json
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+
+class ViewMeasurement:
+    def __init__(self, name, url, status_code, queries, query_time,
+                 wall_time, size):
+        self.name = name
+        self.url = url
+        self.status_code = status_code
+        self.queries = queries
+        self.query_time = query_time
+        self.wall_time = wall_time
+        self.size = size
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'url': self.url,
+            'status_code': self.status_code,
+            'queries': len(self.queries),
+            'query_time_ms': round(self.query_time * 1000, 3),
+            'wall_time_ms': round(self.wall_time * 1000, 3),
+            'bytes': self.size
+        }
+
+
+def measure(client, name, url, data=None):
+    """
+    Выполняет GET-запрос (или POST, если переданы data)
+    и возвращает ViewMeasurement.
+    """
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        if data is None:
+            response = client.get(url)
+        else:
+            response = client.post(url, data)
+        # Потоковый ответ может обращаться к базе, пока отдается тело.
+        content = (b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+        wall_time = time.perf_counter() - started
+    query_time = sum(float(query['time']) for query in captured)
+    return ViewMeasurement(
+        name=name,
+        url=url,
+        status_code=response.status_code,
+        queries=captured.captured_queries,
+        query_time=query_time,
+        wall_time=wall_time,
+        size=len(content)
+    )
+
+
+def iter_view_urls(namespace, urlpatterns, kwargs):
+    """
+    Перебирает все маршруты приложения и подставляет значения
+    параметров из kwargs по именам конвертеров.
+    """
+    for pattern in urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        names = pattern.pattern.converters.keys()
+        name = f'{namespace}:{pattern.name}'
+        yield name, reverse(name, kwargs={key: kwargs[key] for key in names})
+
+
+def write_report(path, measurements):
+    with open(path, 'w', encoding='utf-8') as report:
+        json.dump(
+            [measurement.as_dict() for measurement in measurements],
+            report, ensure_ascii=False, indent=2
+        )
@@ -0,0 +1,115 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.authors import is_reserved_username
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+        for i in range(3):
+            Comment.objects.create(post=cls.posts[-1], author=cls.reader,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ApiTest.reader)
+
+    def get_json(self, name, params=None, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_feeds_return_compact_rows(self):
+        """Ленты отдают посты по убыванию даты и без лишних полей"""
+        data = self.get_json('posts:api_index')
+        self.assertEqual([row['text'] for row in data['results']],
+                         [f'Пост {i}' for i in reversed(range(5))])
+        self.assertEqual(set(data['results'][0]), {
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'comment_count'
+        })
+        self.assertEqual(data['results'][0]['comment_count'], 3)
+        self.assertEqual(data['results'][0]['author'], 'author')
+
+        data = self.get_json('posts:api_group', slug='group')
+        self.assertEqual(data['group']['title'], 'Группа')
+        self.assertEqual(len(data['results']), 2)
+
+        data = self.get_json('posts:api_profile', username='author')
+        self.assertEqual(data['author']['full_name'], 'Лев')
+        self.assertEqual(data['author']['posts'], 5)
+
+        data = self.get_json('posts:api_follow')
+        self.assertEqual(len(data['results']), 5)
+
+    def test_cursor_pagination(self):
+        """Курсор next ведет на следующую страницу"""
+        first = self.get_json('posts:api_index', {'limit': 3})
+        second = self.get_json('posts:api_index',
+                               {'limit': 3, 'after': first['next']})
+        self.assertEqual(len(first['results']), 3)
+        self.assertEqual([row['text'] for row in second['results']],
+                         ['Пост 1', 'Пост 0'])
+        self.assertIsNone(second['next'])
+
+        first = self.get_json('posts:api_follow', {'limit': 4})
+        second = self.get_json('posts:api_follow',
+                               {'limit': 4, 'after': first['next']})
+        self.assertEqual([row['text'] for row in second['results']],
+                         ['Пост 0'])
+
+    def test_post_with_comments(self):
+        """Пост отдается с комментариями от старых к новым"""
+        post = ApiTest.posts[-1]
+        data = self.get_json('posts:api_post', {'limit': 2},
+                             username='author', post_id=post.pk)
+        self.assertEqual(data['post']['id'], post.pk)
+        self.assertEqual([row['text'] for row in data['results']],
+                         ['Комментарий 0', 'Комментарий 1'])
+        data = self.get_json('posts:api_post', {'after': data['next']},
+                             username='author', post_id=post.pk)
+        self.assertEqual([row['author'] for row in data['results']],
+                         ['reader'])
+
+    def test_errors(self):
+        """Аноним не видит ленту подписок, неизвестные адреса дают 404"""
+        self.assertEqual(self.client.get(
+            reverse('posts:api_profile', kwargs={'username': 'nobody'})
+        ).status_code, 404)
+        self.assertEqual(self.client.post(
+            reverse('posts:api_index')
+        ).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.get(
+            reverse('posts:api_follow')
+        ).status_code, 401)
+
+    def test_api_paths_are_reserved_usernames(self):
+        """
+        Имена, под которыми страницы пользователя совпали бы с адресами
+        API, заняты: /api/<post_id>/ и /api/posts/ вели бы не туда
+        """
+        for username in ('api', 'posts', 'follow', 'group'):
+            with self.subTest(username=username):
+                self.assertTrue(is_reserved_username(username))
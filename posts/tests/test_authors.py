@@ -0,0 +1,143 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.authors import (AuthorCard, cache_key, card_user, get_author_card,
+                           get_author_cards, get_author_or_404,
+                           is_reserved_username)
+from posts.models import Post
+
+User = get_user_model()
+
+
+class AuthorCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_card_is_cached(self):
+        """Повторный поиск автора не обращается к базе"""
+        with self.assertNumQueries(1):
+            card = get_author_card('author')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_author_card('author'), card)
+        self.assertEqual(card, AuthorCard(AuthorCacheTest.author.pk, 'author',
+                                          'Лев', 'Толстой'))
+        self.assertEqual(card.get_full_name(), 'Лев Толстой')
+
+    def test_cards_are_fetched_in_one_query(self):
+        """Несколько промахов кеша читаются одним запросом"""
+        User.objects.create_user(username='other')
+        get_author_card('author')
+        with self.assertNumQueries(1):
+            cards = get_author_cards(['author', 'other', 'nobody'])
+        self.assertEqual(set(cards), {'author', 'other'})
+
+    def test_missing_author_is_cached(self):
+        """Несуществующее имя дает 404 и тоже кешируется"""
+        with self.assertNumQueries(1), self.assertRaises(Http404):
+            get_author_or_404('nobody')
+        with self.assertNumQueries(0), self.assertRaises(Http404):
+            get_author_or_404('nobody')
+
+    def test_new_user_replaces_missing_entry(self):
+        """Созданный пользователь находится сразу"""
+        self.assertIsNone(get_author_card('newcomer'))
+        user = User.objects.create_user(username='newcomer')
+        self.assertEqual(get_author_card('newcomer').id, user.pk)
+
+    def test_rename_and_delete_invalidate_card(self):
+        """Переименование и удаление сбрасывают карточку"""
+        user = User.objects.create_user(username='old')
+        get_author_card('old')
+        user.username = 'new'
+        user.save()
+        self.assertIsNone(get_author_card('old'))
+        self.assertEqual(get_author_card('new').id, user.pk)
+        user.delete()
+        self.assertIsNone(get_author_card('new'))
+
+    def test_name_change_invalidates_card(self):
+        """Смена имени и фамилии видна в карточке"""
+        get_author_card('author')
+        user = User.objects.get(username='author')
+        user.first_name = 'Алексей'
+        user.save()
+        self.assertEqual(get_author_card('author').first_name, 'Алексей')
+
+    def test_login_keeps_card(self):
+        """Вход пользователя не сбрасывает карточку"""
+        get_author_card('author')
+        self.client.force_login(AuthorCacheTest.author)
+        self.client.logout()
+        user = User.objects.get(username='author')
+        user.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(cache_key('author')))
+
+    def test_post_page_resolves_author_from_cache(self):
+        """Страница поста ищет пост по id автора из кеша"""
+        url = reverse('posts:post', kwargs={
+            'username': 'author', 'post_id': AuthorCacheTest.post.pk
+        })
+        self.client.get(url)
+        self.assertIsNotNone(cache.get(cache_key('author')))
+        other = User.objects.create_user(username='other')
+        response = self.client.get(reverse('posts:post', kwargs={
+            'username': other.username, 'post_id': AuthorCacheTest.post.pk
+        }))
+        self.assertEqual(response.status_code, 404)
+
+    def test_profile_renders_author_from_card(self):
+        """Профиль выводит автора из карточки, не читая его строку"""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Лев Толстой')
+        self.assertContains(response, 'Записей - 1')
+        self.assertFalse([query['sql'] for query in queries.captured_queries
+                          if 'FROM "auth_user"' in query['sql']])
+
+    def test_card_user_defers_other_fields(self):
+        """Поля вне карточки читаются из базы при обращении"""
+        author = card_user(get_author_card('author'))
+        self.assertIsInstance(author, User)
+        self.assertEqual(author.get_full_name(), 'Лев Толстой')
+        with self.assertNumQueries(1):
+            self.assertEqual(author.date_joined,
+                             AuthorCacheTest.author.date_joined)
+
+
+class ReservedUsernameTest(TestCase):
+
+    def test_route_names_are_reserved(self):
+        """Имена, совпадающие с адресами сайта, заняты"""
+        for username in ('search', 'new', 'group', 'follow', 'api',
+                         'posts', 'admin'):
+            with self.subTest(username=username):
+                self.assertTrue(is_reserved_username(username))
+        for username in ('author', 'apiary', 'Search'):
+            with self.subTest(username=username):
+                self.assertFalse(is_reserved_username(username))
+
+    def test_signup_rejects_reserved_username(self):
+        """Регистрация с занятым адресом именем не проходит"""
+        response = self.client.post(reverse('signup'), {
+            'username': 'search',
+            'password1': 'Sl0zhny-parol',
+            'password2': 'Sl0zhny-parol',
+        })
+        self.assertFalse(User.objects.filter(username='search').exists())
+        self.assertFormError(response, 'form', 'username',
+                             'Это имя занято адресом страницы сайта')
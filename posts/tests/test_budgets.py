@@ -0,0 +1,144 @@
+import os
+import random
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+
+from posts import graph
+from posts import urls as posts_urls
+from posts.authors import get_author_cards
+from posts.models import Comment, Follow, Group, Post
+
+from .budget import iter_view_urls, measure, write_report
+
+User = get_user_model()
+
+REPORT_PATH = os.environ.get('QUERY_BUDGET_REPORT')
+
+# Максимальное число SQL-запросов на одну страницу.
+# Каждый маршрут posts/urls.py обязан иметь здесь бюджет.
+# Для index, group, profile и post в бюджет входят валидаторы
+# условного GET (posts/conditions.py).
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group': 5,
+    'posts:new_post': 5,
+    'posts:follow_index': 5,
+    'posts:search': 2,
+    'posts:profile': 8,
+    'posts:post': 6,
+    'posts:comments': 2,
+    'posts:post_edit': 3,
+    'posts:add_comment': 3,
+    # Подписка: сессия и пользователь, SAVEPOINT/RELEASE транзакции
+    # запроса, INSERT ... RETURNING и UPDATE счетчиков; лента
+    # заполняется задачей после коммита. Отписка еще чистит ленту.
+    'posts:profile_follow': 6,
+    'posts:profile_unfollow': 7,
+    'posts:follow_bulk': 9,
+    'posts:api_index': 1,
+    'posts:api_group': 2,
+    'posts:api_follow': 4,
+    'posts:api_profile': 2,
+    'posts:api_post': 2,
+    'posts:export': 4,
+}
+
+# Маршруты, которые принимают только POST, и данные для них.
+POST_DATA = {
+    'posts:follow_bulk': {
+        'follow': [f'user{i}' for i in range(12, 40)],
+        'unfollow': [f'user{i}' for i in range(2, 7)],
+    },
+}
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Все страницы приложения posts на базе с тысячами постов,
+    комментариев и подписок укладываются в бюджет запросов.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rnd = random.Random(0)
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(150)]
+        cls.reader, cls.author = users[0], users[1]
+        groups = [Group.objects.create(title=f'Группа {i}',
+                                       slug=f'group-{i}',
+                                       description='Описание')
+                  for i in range(10)]
+        Post.objects.bulk_create(
+            (Post(text='Текст ' * rnd.randint(5, 200),
+                  author=rnd.choice(users),
+                  group=rnd.choice(groups + [None]))
+             for _ in range(3000)),
+            batch_size=500
+        )
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            (Comment(post_id=rnd.choice(post_ids),
+                     author=rnd.choice(users),
+                     text='Комментарий')
+             for _ in range(3000)),
+            batch_size=500
+        )
+        Follow.objects.bulk_create(
+            (Follow(user=follower, author=author)
+             for follower in users[2:]
+             for author in rnd.sample(users[1:], 25)
+             if author != follower),
+            batch_size=500
+        )
+        for author in users[2:12]:
+            Follow.objects.create(user=cls.reader, author=author)
+        call_command('rebuild_user_stats', stdout=StringIO())
+
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=rnd.choice(users), text='Ок')
+            for _ in range(60)
+        )
+        cls.usernames = [user.username for user in users]
+        cls.url_kwargs = {
+            'username': cls.author.username,
+            'post_id': cls.post.id,
+            'slug': groups[0].slug,
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(QueryBudgetTest.reader)
+        # Граф подписок строится один раз на процесс, его построение
+        # не относится к запросам страниц.
+        graph.reset()
+        graph.get_graph()
+
+    def test_views_fit_query_budget(self):
+        """Каждая страница posts укладывается в свой бюджет запросов"""
+        measurements = []
+        for name, url in iter_view_urls(
+                posts_urls.app_name, posts_urls.urlpatterns,
+                QueryBudgetTest.url_kwargs):
+            cache.clear()
+            # Карточки авторов обычно уже в кеше: страницы измеряются
+            # в этом, основном, случае.
+            get_author_cards(QueryBudgetTest.usernames)
+            measurement = measure(self.client, name, url,
+                                  POST_DATA.get(name))
+            measurements.append(measurement)
+            with self.subTest(view=name):
+                self.assertIn(name, QUERY_BUDGETS,
+                              f'Не задан бюджет запросов для {name}')
+                self.assertLess(measurement.status_code, 400)
+                self.assertLessEqual(
+                    len(measurement.queries), QUERY_BUDGETS[name],
+                    f'{name} выполняет {len(measurement.queries)} запросов'
+                )
+        if REPORT_PATH:
+            write_report(REPORT_PATH, measurements)
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import graph
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        self.client = Client()
+        self.client.force_login(ConditionalGetTest.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post', kwargs={
+                'username': 'author', 'post_id': ConditionalGetTest.post.pk
+            }),
+        ]
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_return_304(self):
+        """Повторный запрос с тем же ETag получает 304 без рендера"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertTemplateNotUsed('base.html'):
+                    repeat = self.revalidate(url, response)
+                self.assertEqual(repeat.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Комментарий, правка и подписка меняют ETag"""
+        changes = [
+            lambda: Comment.objects.create(post=ConditionalGetTest.post,
+                                           author=ConditionalGetTest.reader,
+                                           text='Ок'),
+            lambda: Post.objects.filter(
+                pk=ConditionalGetTest.post.pk
+            ).bump_version(),
+            lambda: Post.objects.create(text='Новый',
+                                        author=ConditionalGetTest.author,
+                                        group=ConditionalGetTest.group),
+        ]
+        for change in changes:
+            responses = {url: self.client.get(url) for url in self.urls}
+            change()
+            for url, response in responses.items():
+                with self.subTest(url=url):
+                    self.assertEqual(
+                        self.revalidate(url, response).status_code, 200
+                    )
+
+    def test_follow_and_viewer_change_etag(self):
+        """Подписка и другой пользователь получают свежую страницу"""
+        url = self.urls[2]
+        response = self.client.get(url)
+        Follow.objects.create(user=ConditionalGetTest.reader,
+                              author=ConditionalGetTest.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        self.client.logout()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_if_modified_since(self):
+        """Last-Modified совпадает со временем последней правки поста"""
+        self.client.logout()
+        url = self.urls[3]
+        response = self.client.get(url)
+        repeat = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_no_last_modified_for_logged_in_users(self):
+        """Вошедший пользователь не получает 304 по If-Modified-Since"""
+        url = self.urls[3]
+        self.client.logout()
+        anonymous = self.client.get(url)
+        self.client.force_login(ConditionalGetTest.reader)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        repeat = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=anonymous['Last-Modified']
+        )
+        self.assertEqual(repeat.status_code, 200)
@@ -0,0 +1,52 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from posts.models import Follow, Post, User
+
+
+class ExplainViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_yatube', users=20, groups=3, posts=200,
+                     comments=100, follows=3, batch_size=50,
+                     stdout=StringIO())
+
+    def test_feeds_use_indexes(self):
+        """Ленты читаются по составным индексам, без полных проходов"""
+        out = StringIO()
+        call_command('explain_views', '--check', '--ignore', 'posts_group',
+                     stdout=out)
+        output = out.getvalue()
+        self.assertIn('post_pub_date_idx', output)
+        self.assertIn('post_author_pub_date_idx', output)
+        self.assertIn('post_group_pub_date_idx', output)
+        self.assertIn('Запросов без индекса: 0', output)
+
+    def test_check_fails_on_full_scan(self):
+        """--check завершается с ошибкой, если есть полный проход"""
+        with self.assertRaises(CommandError):
+            call_command('explain_views', '--check', stdout=StringIO())
+
+    def test_views_changes_are_rolled_back(self):
+        """Открытие страниц подписки не меняет базу"""
+        follows = Follow.objects.count()
+        posts = Post.objects.count()
+        call_command('explain_views', stdout=StringIO())
+        self.assertEqual(Follow.objects.count(), follows)
+        self.assertEqual(Post.objects.count(), posts)
+
+
+class FollowUniqueTest(TestCase):
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена в базе"""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9'
+             b'\x04\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00'
+             b'\x00\x02\x02\x4c\x01\x00\x3b')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.posts = [Post.objects.create(text=f'Пост {i}', author=cls.author)
+                     for i in range(3)]
+        cls.posts[0].image = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                                content_type='image/gif')
+        cls.posts[0].save()
+        Comment.objects.create(post=cls.posts[1], author=cls.author,
+                               text='Свой, "с кавычками"')
+        Comment.objects.create(post=cls.posts[1], author=cls.other,
+                               text='Чужой')
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTest.author)
+
+    def export(self, export_format):
+        response = self.client.get(
+            reverse('posts:export', kwargs={'username': 'author'}),
+            {'format': export_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_export(self):
+        """NDJSON содержит только посты и комментарии автора"""
+        rows = [json.loads(line)
+                for line in self.export('ndjson').decode().splitlines()]
+        self.assertEqual([(row['type'], row['text']) for row in rows], [
+            ('post', 'Пост 0'), ('post', 'Пост 1'), ('post', 'Пост 2'),
+            ('comment', 'Свой, "с кавычками"'),
+        ])
+        self.assertEqual(rows[0]['image'], ExportTest.posts[0].image.name)
+        self.assertEqual(rows[3]['post_id'], ExportTest.posts[1].pk)
+
+    def test_csv_export(self):
+        """CSV начинается с заголовка и экранирует текст"""
+        rows = list(csv.DictReader(io.StringIO(self.export('csv').decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['text'], 'Свой, "с кавычками"')
+
+    def test_zip_export_contains_images(self):
+        """Архив содержит NDJSON и файлы картинок"""
+        archive = zipfile.ZipFile(io.BytesIO(self.export('zip')))
+        name = ExportTest.posts[0].image.name
+        self.assertEqual(archive.namelist(),
+                         ['posts.ndjson', f'images/{name}'])
+        self.assertEqual(archive.read(f'images/{name}'), SMALL_GIF)
+        self.assertEqual(
+            len(archive.read('posts.ndjson').decode().splitlines()), 4
+        )
+
+    def test_only_author_can_export(self):
+        """Чужую выгрузку получить нельзя"""
+        self.client.force_login(ExportTest.other)
+        response = self.client.get(
+            reverse('posts:export', kwargs={'username': 'author'})
+        )
+        self.assertRedirects(
+            response, reverse('posts:profile', kwargs={'username': 'author'})
+        )
+
+    def test_export_command(self):
+        """Команда export_posts печатает ту же выгрузку"""
+        out = StringIO()
+        call_command('export_posts', 'author', '--format', 'csv',
+                     stdout=out)
+        self.assertEqual(out.getvalue().encode(), self.export('csv'))
+
+        path = f'{settings.MEDIA_ROOT}/author.zip'
+        call_command('export_posts', 'author', '--format', 'zip',
+                     '--output', path, stderr=StringIO())
+        self.assertEqual(len(zipfile.ZipFile(path).namelist()), 2)
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class FollowFeedTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FollowFeedTest.reader)
+
+    def get_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context.get('page')]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост раскладывается в ленты подписчиков автора"""
+        Follow.objects.create(user=FollowFeedTest.reader,
+                              author=FollowFeedTest.author)
+        post = Post.objects.create(text='Пост', author=FollowFeedTest.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=FollowFeedTest.reader, post=post
+        ).exists())
+        self.assertEqual(self.get_feed(), ['Пост'])
+
+    def test_follow_and_unfollow_rebuild_timeline(self):
+        """Подписка добавляет старые посты автора, отписка их убирает"""
+        Post.objects.create(text='Старый пост', author=FollowFeedTest.author)
+        follow = Follow.objects.create(user=FollowFeedTest.reader,
+                                       author=FollowFeedTest.author)
+        self.assertEqual(self.get_feed(), ['Старый пост'])
+
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_popular_author_is_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=FollowFeedTest.star)
+        Follow.objects.create(user=FollowFeedTest.reader,
+                              author=FollowFeedTest.star)
+        Follow.objects.create(user=FollowFeedTest.reader,
+                              author=FollowFeedTest.author)
+        cache.clear()
+
+        Post.objects.create(text='Первый', author=FollowFeedTest.author)
+        Post.objects.create(text='Второй', author=FollowFeedTest.star)
+        Post.objects.create(text='Третий', author=FollowFeedTest.author)
+
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=FollowFeedTest.star
+        ).exists())
+        self.assertEqual(self.get_feed(), ['Третий', 'Второй', 'Первый'])
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_author_leaving_pull_mode_is_backfilled(self):
+        """Посты, написанные в режиме чтения, остаются в ленте"""
+        fans = [User.objects.create_user(username=f'fan{i}')
+                for i in range(2)]
+        for fan in fans:
+            Follow.objects.create(user=fan, author=FollowFeedTest.star)
+        cache.clear()
+        self.get_feed()
+        Post.objects.create(text='Популярный', author=FollowFeedTest.star)
+        # Подписка в режиме чтения ленту не заполняет.
+        Follow.objects.create(user=FollowFeedTest.reader,
+                              author=FollowFeedTest.star)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        Follow.objects.filter(user__in=fans).delete()
+        cache.clear()
+        self.assertEqual(self.get_feed(), ['Популярный'])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=FollowFeedTest.reader, post__author=FollowFeedTest.star
+        ).exists())
@@ -0,0 +1,122 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.follows import MAX_BATCH, follow_authors, unfollow_authors
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class BulkFollowTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(3)]
+        for author in cls.authors:
+            Post.objects.create(text=f'Пост {author.username}', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(BulkFollowTest.reader)
+        self.url = reverse('posts:follow_bulk')
+
+    def post_json(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, json.dumps(data),
+                                    content_type='application/json')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_bulk_follow_creates_follows_and_fills_timeline(self):
+        """Пакетная подписка создает подписки, счетчики и ленту"""
+        response = self.post_json(
+            {'follow': ['author0', 'author1', 'reader', 'nobody']}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['followed'], ['author0', 'author1'])
+        self.assertEqual(Follow.objects.filter(
+            user=BulkFollowTest.reader
+        ).count(), 2)
+        self.assertEqual(self.stats(BulkFollowTest.reader).follower_count, 2)
+        self.assertEqual(
+            self.stats(BulkFollowTest.authors[0]).following_count, 1
+        )
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=BulkFollowTest.reader
+        ).count(), 2)
+
+    def test_bulk_follow_is_idempotent(self):
+        """Повторная подписка ничего не создает и не меняет счетчики"""
+        self.post_json({'follow': ['author0']})
+        response = self.post_json({'follow': ['author0']})
+        self.assertEqual(response.json()['followed'], [])
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.stats(BulkFollowTest.reader).follower_count, 1)
+
+    def test_bulk_unfollow_from_form(self):
+        """Отписка из формы удаляет подписки, счетчики и ленту"""
+        self.post_json({'follow': ['author0', 'author1', 'author2']})
+        response = self.client.post(
+            self.url, {'unfollow': ['author0', 'author2']}
+        )
+        self.assertEqual(response.json()['unfollowed'],
+                         ['author0', 'author2'])
+        self.assertEqual(list(Follow.objects.values_list(
+            'author__username', flat=True
+        )), ['author1'])
+        self.assertEqual(self.stats(BulkFollowTest.reader).follower_count, 1)
+        self.assertEqual(
+            self.stats(BulkFollowTest.authors[2]).following_count, 0
+        )
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=BulkFollowTest.reader
+        ).count(), 1)
+
+    def test_bulk_follow_rejects_bad_requests(self):
+        """Слишком большой пакет и битый JSON дают 400"""
+        response = self.post_json(
+            {'follow': [f'user{i}' for i in range(MAX_BATCH + 1)]}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, '{',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        for data in ({'follow': 'author0'}, {'unfollow': [1]}, ['author0']):
+            with self.subTest(data=data):
+                self.assertEqual(self.post_json(data).status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_counters_follow_changed_rows(self):
+        """
+        Счетчики меняются только на реально вставленные и удаленные строки
+        """
+        reader, author = BulkFollowTest.reader, BulkFollowTest.authors[0]
+        # Подписку успел записать параллельный запрос.
+        Follow.objects.bulk_create([Follow(user=reader, author=author)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(follow_authors(reader, [author.pk]), [])
+        self.assertEqual(self.stats(reader).follower_count, 0)
+        self.assertEqual(self.stats(author).following_count, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_authors(reader, [BulkFollowTest.authors[1].pk])
+        # Параллельный запрос успел удалить подписку первым
+        # и уже уменьшил счетчики.
+        Follow.objects.filter(author=BulkFollowTest.authors[1]).delete()
+        self.assertEqual(
+            unfollow_authors(reader, [BulkFollowTest.authors[1].pk]), []
+        )
+        self.assertEqual(self.stats(reader).follower_count, 0)
+        self.assertEqual(
+            self.stats(BulkFollowTest.authors[1]).following_count, 0
+        )
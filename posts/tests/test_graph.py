@@ -0,0 +1,186 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts import graph
+from posts.follows import follow_authors
+from posts.graph import FollowGraph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTest(SimpleTestCase):
+
+    def setUp(self):
+        self.graph = FollowGraph()
+        edges = [(1, 2), (1, 3), (2, 4), (2, 5), (3, 4), (3, 6), (4, 1)]
+        self.graph.ready = self.graph.load(7, iter(edges))
+
+    def test_load_builds_both_directions(self):
+        """Граф строит списки подписок и подписчиков"""
+        self.assertEqual(self.graph.following(1), {2, 3})
+        self.assertEqual(self.graph.followers(4), {2, 3})
+        self.assertEqual(list(self.graph.in_targets[
+            self.graph.in_offsets[4]:self.graph.in_offsets[5]
+        ]), [2, 3])
+        self.assertEqual(self.graph.following(40), set())
+
+    def test_suggestions_rank_friends_of_friends(self):
+        """Рекомендации по числу общих подписок, без своих подписок"""
+        self.assertEqual(self.graph.suggestions(1), [(4, 2), (5, 1), (6, 1)])
+        self.assertEqual(self.graph.suggestions(1, limit=1), [(4, 2)])
+
+    def test_mutual_followers(self):
+        """Общие подписчики среди своих подписок"""
+        self.assertEqual(self.graph.mutual_followers(1, 4), [2, 3])
+        self.assertEqual(self.graph.mutual_followers(1, 6), [3])
+
+    def test_incremental_changes_survive_rebuild(self):
+        """Изменения видны сразу и не теряются при перестройке"""
+        edges = [(1, 2), (1, 3), (2, 4), (2, 5), (3, 4), (3, 6), (4, 1)]
+        # Перестройка идет: новые массивы прочитаны до изменений.
+        self.graph.building = True
+        self.graph.add_edge(1, 4)
+        self.graph.add_edge(9, 1)
+        self.graph.remove_edge(2, 5)
+        self.graph.remove_user(6)
+        expected = {1: {2, 3, 4}, 2: {4}, 3: {4}, 9: {1}}
+        for user_id, following in expected.items():
+            self.assertEqual(self.graph.following(user_id), following)
+        self.assertEqual(self.graph.followers(1), {4, 9})
+
+        staging = FollowGraph()
+        staging.ready = staging.load(7, iter(edges))
+        self.graph.swap(staging)
+        for user_id, following in expected.items():
+            self.assertEqual(self.graph.following(user_id), following)
+        self.assertEqual(self.graph.followers(1), {4, 9})
+
+    def test_suggestions_sample_large_neighbourhoods(self):
+        """У активных аккаунтов учитываются не только старые подписки"""
+        # Старшие по id подписки читают одного автора, новые - другого.
+        friends = range(2, 2000)
+        edges = sorted([(1, friend) for friend in friends]
+                       + [(friend, 3000 + (friend > 1000))
+                          for friend in friends])
+        self.graph.ready = self.graph.load(3002, iter(edges))
+        scores = dict(self.graph.suggestions(1))
+        self.assertEqual(sum(scores.values()), graph.MAX_NEIGHBOURS)
+        self.assertGreater(scores[3001], 0)
+        self.assertGreater(scores[3000], 0)
+
+    def test_graph_over_budget_is_not_loaded(self):
+        """Граф больше FOLLOW_GRAPH_MAX_EDGES не загружается"""
+        with self.settings(FOLLOW_GRAPH_MAX_EDGES=3):
+            self.assertFalse(self.graph.load(7, iter([(1, 2)] * 4)))
+
+
+class SlowBuildGraph(FollowGraph):
+    """Граф, построение которого ждет сигнала теста."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        self.started.set()
+        self.release.wait(5)
+        staging = FollowGraph()
+        staging.ready = staging.load(3, iter([(1, 2)]))
+        self.swap(staging)
+
+
+class BrokenGraph(FollowGraph):
+    """Граф, построение которого всегда падает."""
+
+    def __init__(self):
+        super().__init__()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        raise RuntimeError('база недоступна')
+
+
+class FailedBuildTest(SimpleTestCase):
+
+    def test_failed_build_is_retried_once_per_ttl(self):
+        """Упавшее построение не повторяется на каждом запросе"""
+        follow_graph = BrokenGraph()
+        with self.assertLogs('posts.graph', 'ERROR'):
+            follow_graph.ensure_fresh()
+        follow_graph.ensure_fresh()
+        self.assertEqual(follow_graph.builds, 1)
+        self.assertFalse(follow_graph.ready)
+        with self.settings(FOLLOW_GRAPH_TTL=0), \
+                self.assertLogs('posts.graph', 'ERROR'):
+            follow_graph.ensure_fresh()
+        self.assertEqual(follow_graph.builds, 2)
+
+
+@override_settings(FOLLOW_GRAPH_BACKGROUND=True)
+class BackgroundBuildTest(SimpleTestCase):
+
+    def test_requests_do_not_wait_for_build(self):
+        """Построение идет в фоне, изменения за это время не теряются"""
+        follow_graph = SlowBuildGraph()
+        follow_graph.ensure_fresh()
+        self.assertTrue(follow_graph.started.wait(5))
+        self.assertFalse(follow_graph.ready)
+        self.assertEqual(follow_graph.suggestions(1), [])
+        follow_graph.ensure_fresh()
+        follow_graph.add_edge(2, 1)
+
+        follow_graph.release.set()
+        deadline = time.monotonic() + 5
+        while follow_graph.building and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(follow_graph.builds, 1)
+        self.assertEqual(follow_graph.following(1), {2})
+        self.assertEqual(follow_graph.following(2), {1})
+
+
+class FollowGraphViewsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.friend = User.objects.create_user(username='friend')
+        cls.star = User.objects.create_user(username='star')
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        graph.get_graph()
+        self.client = Client()
+        self.client.force_login(FollowGraphViewsTest.reader)
+
+    def test_signals_update_suggestions_and_mutuals(self):
+        """Новые подписки сразу попадают в рекомендации и общих"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=FollowGraphViewsTest.friend,
+                                  author=FollowGraphViewsTest.star)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'],
+                         [(FollowGraphViewsTest.star, 1)])
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'star'})
+        )
+        self.assertEqual(response.context['mutuals'],
+                         [FollowGraphViewsTest.friend])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow_authors(FollowGraphViewsTest.reader,
+                           [FollowGraphViewsTest.star.pk])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'], [])
@@ -0,0 +1,228 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.search import get_backend
+
+User = get_user_model()
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9'
+             b'\x04\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00'
+             b'\x00\x02\x02\x4c\x01\x00\x3b')
+
+RECORDS = [
+    {'type': 'group', 'slug': 'cats', 'title': 'Коты',
+     'description': 'О котах'},
+    {'type': 'post', 'id': 1, 'author': 'author', 'group': 'cats',
+     'date': '2020-01-02T03:04:05', 'text': 'Рыжие коты'},
+    {'type': 'post', 'id': 2, 'author': 'author', 'group': 'dogs',
+     'date': '2020-01-03T00:00:00', 'text': 'Собаки'},
+    {'type': 'post', 'id': 3, 'author': 'newcomer',
+     'date': '2020-01-04T00:00:00', 'text': 'Пост нового автора'},
+    {'type': 'comment', 'id': 1, 'post_id': 1, 'author': 'author',
+     'date': '2020-01-05T00:00:00', 'text': 'Комментарий'},
+    {'type': 'comment', 'id': 2, 'post_id': 3, 'author': 'author',
+     'text': 'К посту без автора'},
+]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+class ImportPostsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def write(self, records, name='posts.ndjson'):
+        path = os.path.join(ImportPostsTest.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_posts', path, '--batch-size', '2', *args,
+                         stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_import_creates_groups_posts_and_comments(self):
+        """Импорт создает группы, посты с датами и комментарии"""
+        output = self.run_import(self.write(RECORDS))
+        self.assertIn('постов 2', output)
+        self.assertIn('пропущено без автора 1', output)
+        self.assertEqual(
+            set(Group.objects.values_list('slug', 'title')),
+            {('cats', 'Коты'), ('dogs', 'dogs')}
+        )
+        post = Post.objects.get(text='Рыжие коты')
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date.isoformat(), '2020-01-02T03:04:05')
+        dogs = Post.objects.get(text='Собаки')
+        self.assertEqual(dogs.updated, dogs.pub_date)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.created.isoformat(), '2020-01-05T00:00:00')
+
+    def test_import_updates_counters_feeds_and_search(self):
+        """Счетчики, ленты подписчиков и поиск учитывают новые посты"""
+        self.run_import(self.write(RECORDS))
+        posts = set(Post.objects.values_list('id', flat=True))
+        ImportPostsTest.author.stats.refresh_from_db()
+        self.assertEqual(ImportPostsTest.author.stats.post_count, 2)
+        self.assertEqual(set(TimelineEntry.objects.filter(
+            user=ImportPostsTest.reader
+        ).values_list('post_id', flat=True)), posts)
+        post = Post.objects.get(text='Рыжие коты')
+        self.assertEqual(get_backend().search('кот', 0, 10)[0], post.pk)
+
+    def test_create_users(self):
+        """С --create-users отсутствующие авторы создаются без пароля"""
+        self.run_import(self.write(RECORDS), '--create-users')
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(newcomer.stats.post_count, 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_ids_shift_past_existing_rows(self):
+        """id из файла сдвигаются за существующие записи"""
+        existing = Post.objects.create(text='Старый',
+                                       author=ImportPostsTest.author)
+        self.run_import(self.write(RECORDS))
+        post = Post.objects.get(text='Рыжие коты')
+        self.assertEqual(post.pk, existing.pk + 1)
+        self.assertEqual(Comment.objects.get().post, post)
+
+    def test_new_posts_get_ids_after_imported(self):
+        """После импорта обычный пост получает следующий свободный id"""
+        self.run_import(self.write(RECORDS))
+        last = Post.objects.latest('id')
+        post = Post.objects.create(text='Новый', author=ImportPostsTest.author)
+        self.assertEqual(post.pk, last.pk + 1)
+
+    def test_comment_in_later_batch_bumps_post_version(self):
+        """Комментарий из следующей пачки сбрасывает карточку поста"""
+        self.run_import(self.write(RECORDS[1:3] + RECORDS[4:5]))
+        post = Post.objects.get(text='Рыжие коты')
+        self.assertEqual(post.updated_version, 1)
+        self.assertEqual(post.comments.count(), 1)
+
+    def test_resume_from_checkpoint(self):
+        """Прерванный импорт продолжается без дублей"""
+        path = self.write(RECORDS)
+        with open(f'{path}.checkpoint', 'w') as file:
+            json.dump({'line': 2, 'post_offset': 0, 'comment_offset': 0},
+                      file)
+        self.run_import(path)
+        self.assertEqual(list(Post.objects.values_list('text', flat=True)),
+                         ['Собаки'])
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+        # Новый импорт сдвигает id за уже загруженный пост.
+        self.run_import(path)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_repeated_batch_is_ignored(self):
+        """Повтор пачки с теми же id не создает дублей"""
+        path = self.write(RECORDS)
+        self.run_import(path, '--checkpoint', f'{path}.state')
+        with open(f'{path}.state', 'w') as file:
+            json.dump({'line': 0, 'post_offset': 0, 'comment_offset': 0},
+                      file)
+        self.run_import(path, '--checkpoint', f'{path}.state')
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        ImportPostsTest.author.stats.refresh_from_db()
+        self.assertEqual(ImportPostsTest.author.stats.post_count, 2)
+
+    def test_images_are_copied(self):
+        """Картинки берутся из каталога --images"""
+        images = tempfile.mkdtemp(dir=ImportPostsTest.directory)
+        with open(os.path.join(images, 'small.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        path = self.write([{'type': 'post', 'id': 1, 'author': 'author',
+                            'image': 'small.gif', 'text': 'С картинкой'}])
+        self.run_import(path, '--images', images)
+        post = Post.objects.get()
+        self.assertEqual(post.image.read(), SMALL_GIF)
+
+    def media_files(self):
+        return sorted(
+            name for _, _, names in os.walk(settings.MEDIA_ROOT)
+            for name in names
+        )
+
+    def test_images_are_not_left_behind(self):
+        """Картинки откатившейся или уже загруженной пачки удаляются"""
+        images = tempfile.mkdtemp(dir=ImportPostsTest.directory)
+        with open(os.path.join(images, 'small.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        path = self.write([{'type': 'post', 'id': 1, 'author': 'author',
+                            'image': 'small.gif', 'text': 'С картинкой'}])
+        before = self.media_files()
+        with mock.patch(
+            'posts.management.commands.import_posts.reset_sequences',
+            side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.run_import(path, '--images', images)
+        self.assertEqual(self.media_files(), before)
+
+        self.run_import(path, '--images', images, '--checkpoint',
+                        f'{path}.state')
+        loaded = self.media_files()
+        # Повтор той же пачки пропускает пост и не оставляет копию.
+        with open(f'{path}.state', 'w') as file:
+            json.dump({'line': 0, 'post_offset': 0, 'comment_offset': 0},
+                      file)
+        self.run_import(path, '--images', images, '--checkpoint',
+                        f'{path}.state')
+        self.assertEqual(self.media_files(), loaded)
+
+    def test_non_numeric_id_is_reported(self):
+        """Нечисловой id останавливает импорт с номером строки"""
+        path = self.write(RECORDS[:1] + [
+            {'type': 'comment', 'id': 1, 'post_id': 'abc',
+             'author': 'author'},
+        ])
+        with self.assertRaisesMessage(CommandError,
+                                      'Строка 2: поле post_id не число'):
+            self.run_import(path)
+        path = self.write([{'type': 'post', 'id': None}])
+        with self.assertRaisesMessage(CommandError,
+                                      'Строка 1: поле id не число'):
+            self.run_import(path)
+
+    def test_export_round_trip(self):
+        """Выгрузка export_posts загружается обратно"""
+        Post.objects.create(text='Для выгрузки', author=ImportPostsTest.author)
+        out = StringIO()
+        call_command('export_posts', 'author', stdout=out)
+        path = os.path.join(ImportPostsTest.directory, 'export.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(out.getvalue())
+        self.run_import(path, '--author', 'reader')
+        self.assertEqual(
+            Post.objects.filter(author=ImportPostsTest.reader).get().text,
+            'Для выгрузки'
+        )
@@ -0,0 +1,123 @@
+import re
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+def sample(text, name, **labels):
+    """Значение метрики name с метками labels из текста Prometheus."""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(
+        rf'^{re.escape(name)}{{{re.escape(label_text)}}} (\S+)$', text, re.M
+    )
+    return float(match.group(1)) if match else None
+
+
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_view_requests_are_recorded(self):
+        """Ответы, запросы к базе и размер страниц считаются по маршрутам"""
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        post_url = reverse('posts:post', kwargs={
+            'username': 'author', 'post_id': MetricsTest.post.pk
+        })
+        response = self.client.get(post_url)
+        self.client.get('/author/404404/')
+
+        text = self.scrape()
+        self.assertEqual(sample(text, 'yatube_requests_total',
+                                view='posts:index', status='2xx'), 2)
+        self.assertEqual(sample(text, 'yatube_requests_total',
+                                view='posts:post', status='4xx'), 1)
+        self.assertEqual(sample(text, 'yatube_request_duration_seconds_count',
+                                view='posts:index'), 2)
+        self.assertEqual(sample(text, 'yatube_request_duration_seconds_bucket',
+                                view='posts:index', le='+Inf'), 2)
+        self.assertGreater(sample(text, 'yatube_db_queries_total',
+                                  view='posts:index'), 0)
+        self.assertGreater(sample(text, 'yatube_template_render_seconds_total',
+                                  view='posts:index'), 0)
+        self.assertGreaterEqual(sample(text, 'yatube_response_bytes_total',
+                                       view='posts:post'),
+                                len(response.content))
+
+    def test_cache_hits_and_misses(self):
+        """Чтения кеша делятся на попадания и промахи"""
+        self.client.get(reverse('posts:index'))
+        first = self.scrape()
+        misses = sample(first, 'yatube_cache_requests_total',
+                        view='posts:index', result='miss')
+        self.assertGreater(misses, 0)
+
+        metrics.reset()
+        self.client.get(reverse('posts:index'))
+        second = self.scrape()
+        self.assertGreater(sample(second, 'yatube_cache_requests_total',
+                                  view='posts:index', result='hit'), 0)
+
+    def test_metrics_are_not_public(self):
+        """С чужого адреса метрики видны только сотрудникам"""
+        url = reverse('metrics')
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_streaming_response_size(self):
+        """Размер потокового ответа считается по отданным байтам"""
+        self.client.force_login(MetricsTest.author)
+        response = self.client.get(reverse('posts:export',
+                                           kwargs={'username': 'author'}))
+        body = b''.join(response.streaming_content)
+        response.close()
+        text = self.scrape()
+        self.assertEqual(sample(text, 'yatube_response_bytes_total',
+                                view='posts:export'), len(body))
+
+    def test_finished_threads_keep_their_counts(self):
+        """Счетчики завершившегося потока не теряются"""
+        thread = threading.Thread(
+            target=metrics.record,
+            args=('thread:view', 200, 0.01, 10, metrics.RequestStats())
+        )
+        thread.start()
+        thread.join()
+        del thread
+        text = self.scrape()
+        self.assertEqual(sample(text, 'yatube_requests_total',
+                                view='thread:view', status='2xx'), 1)
+        self.assertEqual(len(metrics._stores), 1)
+
+    def test_user_named_metrics_keeps_profile(self):
+        """Адрес метрик не закрывает страницу пользователя metrics"""
+        User.objects.create_user(username='metrics')
+        response = self.client.get(reverse('posts:profile',
+                                           kwargs={'username': 'metrics'}))
+        self.assertEqual(response.status_code, 200)
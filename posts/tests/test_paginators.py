@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post, User, UserStats
+from posts.paginators import CountedPaginator
+
+
+class CountedPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(12)
+        )
+
+    def test_known_count_skips_count_query(self):
+        """Известное число записей не требует COUNT(*)"""
+        paginator = CountedPaginator(Post.objects.order_by('id'), 5, 30)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(6)
+            self.assertEqual(len(page), 0)
+        self.assertEqual(paginator.num_pages, 6)
+        self.assertIs(type(page.paginator), Paginator)
+        self.assertEqual(page.paginator.num_pages, 6)
+
+    def test_unknown_count_is_queried(self):
+        """Без числа записей паджинатор считает их как обычно"""
+        paginator = CountedPaginator(Post.objects.order_by('id'), 5, None)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 12)
+        self.assertEqual(len(paginator.get_page(3)), 2)
+
+
+class PageWindowTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        # bulk_create обходит сигналы: число постов задается счетчиком.
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(500)
+        )
+        UserStats.objects.filter(user=cls.user).update(post_count=500)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, page):
+        return self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            {'page': page}
+        ).content.decode()
+
+    def test_page_bar_has_fixed_size(self):
+        """Панель страниц выводит окно номеров, а не все 100 страниц"""
+        html = self.get(50)
+        self.assertIn('?page=1"', html)
+        self.assertIn('?page=100"', html)
+        self.assertIn('?page=45"', html)
+        self.assertNotIn('?page=44"', html)
+        self.assertNotIn('?page=56"', html)
+        self.assertEqual(html.count('…'), 2)
+        self.assertLessEqual(html.count('class="page-item'), 17)
+
+    def test_page_count_comes_from_counter(self):
+        """Число страниц профиля берется из UserStats без COUNT(*)"""
+        UserStats.objects.filter(user=self.user).update(post_count=25)
+        html = self.get(1)
+        self.assertIn('?page=5"', html)
+        self.assertNotIn('?page=6"', html)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import graph
+from posts.authors import get_author_cards
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueryCountTest(TestCase):
+    """
+    Число запросов страницы ленты не зависит от числа постов на ней.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test-slug',
+            description='a' * 50
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            post = Post.objects.create(
+                text=f'Текст-{i}',
+                author=cls.author,
+                group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        get_author_cards(['reader', 'author'])
+        self.client = Client()
+        self.client.force_login(FeedQueryCountTest.reader)
+        graph.reset()
+        graph.get_graph()
+
+    def test_feed_pages_have_fixed_query_budget(self):
+        """Ленты укладываются в фиксированный бюджет запросов"""
+        # Бюджеты включают выборку валидаторов условного GET.
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group', kwargs={'slug': 'test-slug'}): 5,
+            reverse('posts:follow_index'): 4,
+            reverse('posts:profile', kwargs={'username': 'author'}): 7,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.search import MemorySearchBackend
+from posts.stemmer import stem
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='username')
+        cls.cat_post = Post.objects.create(
+            text='Мой кот любит спать на подоконнике',
+            author=cls.user
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собаки гуляли во дворе',
+            author=cls.user
+        )
+        Comment.objects.create(post=cls.dog_post, author=cls.user,
+                               text='Какие красивые котики')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.pk for post in response.context.get('posts')]
+
+    def test_stemmer_reduces_word_forms(self):
+        """Стеммер приводит формы слова к общей основе"""
+        self.assertEqual(stem('котами'), stem('кот'))
+        self.assertEqual(stem('гуляла'), stem('гуляли'))
+
+    def test_search_finds_word_forms_and_prefixes(self):
+        """Поиск находит другие формы слова и работает по префиксу"""
+        self.assertEqual(self.search('собакой'), [SearchTest.dog_post.pk])
+        self.assertEqual(self.search('подокон'), [SearchTest.cat_post.pk])
+
+    def test_search_ranks_posts_above_comments(self):
+        """Совпадение в тексте поста важнее совпадения в комментарии"""
+        self.assertEqual(
+            self.search('кот'),
+            [SearchTest.cat_post.pk, SearchTest.dog_post.pk]
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        post = Post.objects.create(text='Черновик', author=SearchTest.user)
+        post.text = 'Чистовик'
+        post.save()
+        self.assertEqual(self.search('черновик'), [])
+        self.assertEqual(self.search('чистовик'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('чистовик'), [])
+
+    def test_memory_backend_matches_sqlite_backend(self):
+        """Резервный индекс в памяти ищет так же, как FTS5"""
+        backend = MemorySearchBackend()
+        self.assertEqual(
+            backend.search('кот', 0, 10),
+            [SearchTest.cat_post.pk, SearchTest.dog_post.pk]
+        )
+        self.assertEqual(backend.search('собак гуля', 0, 10),
+                         [SearchTest.dog_post.pk])
+        backend.remove_post(SearchTest.cat_post.pk)
+        self.assertEqual(backend.search('подоконник', 0, 10), [])
+
+    def test_memory_backend_picks_up_other_processes(self):
+        """Индекс в памяти по истечении TTL видит записи без сигналов"""
+        backend = MemorySearchBackend()
+        self.assertEqual(backend.search('ежик', 0, 10), [])
+        # bulk_create не вызывает сигналов, как сохранение в другом
+        # процессе.
+        Post.objects.bulk_create([
+            Post(text='Ежик в тумане', author=SearchTest.user)
+        ])
+        post = Post.objects.get(text='Ежик в тумане')
+        with override_settings(SEARCH_INDEX_TTL=None):
+            self.assertEqual(backend.search('ежик', 0, 10), [])
+        with override_settings(SEARCH_INDEX_TTL=0):
+            self.assertEqual(backend.search('ежик', 0, 10), [post.pk])
+
+    def test_changes_during_rebuild_are_kept(self):
+        """Изменения во время перестройки повторяются поверх нее"""
+        backend = MemorySearchBackend()
+        backend.search('кот', 0, 10)
+        staging = MemorySearchBackend()
+        staging.build()
+        backend.building = True
+        backend.remove_post(SearchTest.cat_post.pk)
+        backend.swap(staging)
+        backend.building = False
+        self.assertEqual(backend.search('подоконник', 0, 10), [])
@@ -0,0 +1,49 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.search import get_backend
+
+
+class SeedCommandTest(TestCase):
+
+    def seed(self, seed=0):
+        call_command('seed_yatube', users=20, groups=3, posts=200,
+                     comments=100, follows=3, seed=seed, batch_size=50,
+                     stdout=StringIO())
+
+    def snapshot(self):
+        return list(Post.objects.order_by('id').values_list(
+            'text', 'author__username', 'group__slug'
+        ))
+
+    def test_seed_creates_requested_volumes(self):
+        """seed_yatube создает заданное число объектов и ленты подписок"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            User.objects.get(username='seed_user_0').stats.post_count,
+            Post.objects.filter(author__username='seed_user_0').count()
+        )
+
+    def test_seeded_posts_are_searchable(self):
+        """Посты, созданные bulk_create, попадают в поисковый индекс"""
+        self.seed()
+        post = Post.objects.order_by('id').first()
+        word = post.text.split()[-1]
+        self.assertIn(post.pk, get_backend().search(word, 0, 1000))
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый seed дает одинаковые данные"""
+        self.seed(seed=7)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed(seed=7)
+        self.assertEqual(self.snapshot(), first)
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import slowlog
+from posts.models import Post
+from posts.slowlog import normalize
+
+User = get_user_model()
+
+
+class SlowQueryLogTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Без SLOW_QUERY_MS обертка не ставится при старте.
+        slowlog.install()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def logged(self, func):
+        """Записи журнала при нулевом пороге: медленный каждый запрос."""
+        with self.settings(SLOW_QUERY_MS=0), \
+                self.assertLogs('posts.slow_queries', 'WARNING') as logs:
+            func()
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_query_is_logged_with_caller_and_plan(self):
+        """В журнал попадают SQL, параметры, место вызова и план"""
+        entries = self.logged(
+            lambda: Post.objects.filter(author=SlowQueryLogTest.author).first()
+        )
+        entry = entries[0]
+        self.assertIn('FROM "posts_post"', entry['sql'])
+        self.assertIn(str(SlowQueryLogTest.author.pk), entry['params'])
+        self.assertGreaterEqual(entry['duration_ms'], 0)
+        self.assertTrue(entry['caller'].startswith(
+            'posts/tests/test_slowlog.py:'
+        ))
+        self.assertTrue(any('posts_post' in line for line in entry['plan']))
+        self.assertIsNone(entry['template'])
+
+    def test_template_line_is_attributed(self):
+        """Запрос из шаблона указывает на строку шаблона"""
+        post = Post.objects.get(pk=SlowQueryLogTest.post.pk)
+        entries = self.logged(
+            lambda: render_to_string('posts/post_card.html', {'post': post})
+        )
+        self.assertIn('FROM "auth_user"', entries[0]['sql'])
+        self.assertEqual(entries[0]['template'], 'posts/post_card.html:21')
+
+    def test_explain_uses_savepoint_in_transaction(self):
+        """Внутри транзакции EXPLAIN выполняется в точке сохранения"""
+        self.assertTrue(connection.in_atomic_block)
+        with CaptureQueriesContext(connection) as queries:
+            entries = self.logged(lambda: Post.objects.first())
+        self.assertTrue(entries[0]['plan'])
+        executed = [query['sql'] for query in queries.captured_queries]
+        explain = next(i for i, sql in enumerate(executed)
+                       if sql.startswith('EXPLAIN'))
+        self.assertTrue(executed[explain - 1].startswith('SAVEPOINT'))
+        self.assertTrue(executed[explain + 1].startswith('RELEASE'))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_log_can_be_disabled(self):
+        """SLOW_QUERY_MS = None выключает журнал"""
+        with self.assertNoLogs('posts.slow_queries'):
+            Post.objects.count()
+
+
+class SlowQueriesCommandTest(TestCase):
+
+    def test_summary_groups_queries(self):
+        """Сводка группирует запросы с разными значениями"""
+        path = os.path.join(tempfile.mkdtemp(), 'slow.log')
+        entries = [
+            ('SELECT * FROM "posts_post" WHERE "id" IN (%s, %s)', 300,
+             'posts/views.py:10 index'),
+            ('SELECT * FROM "posts_post" WHERE "id" IN (%s, %s, %s)', 500,
+             'posts/views.py:10 index'),
+            ('SELECT COUNT(*) FROM "posts_comment" LIMIT 21', 250,
+             'posts/views.py:20 post_view'),
+        ]
+        # Одна запись лежит в ротированной копии журнала.
+        for log_path, chunk in ((f'{path}.1', entries[:1]),
+                                (path, entries[1:])):
+            with open(log_path, 'w', encoding='utf-8') as file:
+                for sql, duration, caller in chunk:
+                    file.write(json.dumps({
+                        'sql': sql, 'duration_ms': duration,
+                        'caller': caller, 'template': None,
+                        'plan': [f'plan {duration}'],
+                    }) + '\n')
+
+        out = StringIO()
+        call_command('slow_queries', '--log', path, stdout=out)
+        output = out.getvalue()
+        self.assertIn('2 раз, всего 800.0 мс, максимум 500.0 мс', output)
+        self.assertIn('2 x posts/views.py:10 index', output)
+        self.assertIn('план: plan 500', output)
+        self.assertLess(output.index('800.0'), output.index('250.0'))
+
+    def test_normalize(self):
+        """Литералы и списки IN не различают запросы"""
+        self.assertEqual(
+            normalize("SELECT 1 FROM t WHERE a = 'x' AND id IN (%s, %s)"),
+            'SELECT ? FROM t WHERE a = ? AND id IN (%s, ...)'
+        )
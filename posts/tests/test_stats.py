@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+
+    def get_counters(self, user):
+        return UserStats.objects.get(user=user).as_counters()
+
+    def test_counters_follow_posts_and_follows(self):
+        """Счетчики меняются при создании и удалении постов и подписок"""
+        post = Post.objects.create(text='Пост', author=UserStatsTest.author)
+        follow = Follow.objects.create(user=UserStatsTest.user,
+                                       author=UserStatsTest.author)
+        self.assertEqual(
+            self.get_counters(UserStatsTest.author),
+            {'follower_count': 0, 'following_count': 1, 'post_count': 1}
+        )
+        self.assertEqual(
+            self.get_counters(UserStatsTest.user),
+            {'follower_count': 1, 'following_count': 0, 'post_count': 0}
+        )
+
+        post.delete()
+        follow.delete()
+        self.assertEqual(
+            self.get_counters(UserStatsTest.author),
+            {'follower_count': 0, 'following_count': 0, 'post_count': 0}
+        )
+
+    def test_rebuild_command_checks_and_fixes_counters(self):
+        """rebuild_user_stats находит и исправляет расхождения"""
+        Post.objects.create(text='Пост', author=UserStatsTest.author)
+        Post.objects.create(text='Пост 2', author=UserStatsTest.author)
+        UserStats.objects.filter(user=UserStatsTest.author).update(
+            post_count=10
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_user_stats', check=True,
+                         stdout=StringIO(), stderr=StringIO())
+
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertEqual(
+            self.get_counters(UserStatsTest.author)['post_count'], 2
+        )
+        call_command('rebuild_user_stats', check=True, stdout=StringIO())
+
+    def test_backfill_matches_rebuild(self):
+        """Ленивое заполнение считает подписки как rebuild_user_stats"""
+        Follow.objects.create(user=UserStatsTest.user,
+                              author=UserStatsTest.author)
+        Follow.objects.create(user=UserStatsTest.user, author=None)
+        UserStats.objects.filter(user=UserStatsTest.user).delete()
+        user = User.objects.get(pk=UserStatsTest.user.pk)
+        self.assertEqual(UserStats.for_user(user).follower_count, 1)
+        call_command('rebuild_user_stats', check=True, stdout=StringIO())
+
+    def test_rebuild_keeps_fanout_pull(self):
+        """rebuild_user_stats меняет только счетчики"""
+        UserStats.objects.filter(user=UserStatsTest.author).update(
+            post_count=10, fanout_pull=True
+        )
+        UserStats.objects.filter(user=UserStatsTest.user).delete()
+        call_command('rebuild_user_stats', stdout=StringIO())
+        stats = UserStats.objects.get(user=UserStatsTest.author)
+        self.assertEqual(stats.post_count, 0)
+        self.assertTrue(stats.fanout_pull)
+        self.assertEqual(self.get_counters(UserStatsTest.user),
+                         {'follower_count': 0, 'following_count': 0,
+                          'post_count': 0})
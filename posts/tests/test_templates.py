@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Engine, Template, engines
+from django.test import TestCase
+
+from posts.models import Post, User
+from posts.warmup import warm_templates
+
+
+class PostCardsTagTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(text=f'Пост номер {i}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_cards_renders_every_post(self):
+        """post_cards выводит карточку каждого поста"""
+        template = Template('{% load post_cards %}{% post_cards posts %}')
+        html = template.render(Context({
+            'posts': Post.objects.for_feed(), 'user': self.user
+        }))
+        for i in range(3):
+            self.assertIn(f'Пост номер {i}', html)
+        self.assertEqual(html.count('class="card mb-3'), 3)
+
+    def test_post_cards_does_not_leak_context(self):
+        """После тега в контексте не остаются post и sizes"""
+        template = Template(
+            '{% load post_cards %}{% post_cards posts sizes="50vw" %}'
+            '[{{ post }}|{{ sizes }}]'
+        )
+        html = template.render(Context({'posts': Post.objects.for_feed()}))
+        self.assertTrue(html.endswith('[|]'))
+
+
+class WarmTemplatesTest(TestCase):
+
+    def test_warm_templates_fills_cached_loader(self):
+        """Прогрев компилирует все шаблоны проекта в кеш загрузчика"""
+        project = engines['django'].engine
+        engine = Engine(
+            dirs=project.dirs,
+            loaders=[('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ])],
+            libraries=project.libraries,
+        )
+        count = warm_templates(engine)
+        cached = engine.template_loaders[0].get_template_cache
+        self.assertIn('index.html', cached)
+        self.assertIn('posts/post_item.html', cached)
+        self.assertEqual(len(cached), count)
+
+    def test_benchmark_command_runs(self):
+        """benchmark_templates печатает все четыре варианта"""
+        Post.objects.create(text='Текст',
+                            author=User.objects.create_user(username='u'))
+        out = StringIO()
+        call_command('benchmark_templates', repeat=1, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
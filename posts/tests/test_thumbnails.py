@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.tasks import thumbnails_outdated
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(size=(1200, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name='picture.png', content=buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='username')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ThumbnailTest.user)
+
+    def create_post_with_image(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('posts:new_post'),
+                             {'text': 'С картинкой', 'image': image_file()})
+        return Post.objects.get()
+
+    def test_thumbnails_are_generated_after_upload(self):
+        """После загрузки картинки миниатюры готовы и выводятся в ленте"""
+        post = self.create_post_with_image()
+        card = post.thumbnails['card']
+        self.assertEqual(post.thumbnails['source'], post.image.name)
+        self.assertEqual(
+            (post.thumbnails['width'], post.thumbnails['height']), (1200, 600)
+        )
+        self.assertEqual((card['width'], card['height']), (960, 339))
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, card['url'])
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_derivatives_in_several_widths_and_formats(self):
+        """Копии есть в нескольких ширинах и форматах, без увеличения"""
+        post = self.create_post_with_image()
+        variants = post.thumbnails['variants']
+        self.assertEqual({variant['width'] for variant in variants},
+                         {480, 960})
+        self.assertIn('image/webp',
+                      {variant['type'] for variant in variants})
+        for variant in variants:
+            with Image.open(os.path.join(MEDIA_ROOT, variant['name'])) as im:
+                self.assertEqual(im.size,
+                                 (variant['width'], variant['height']))
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, post.thumbnails['card']['srcset'])
+
+    def test_thumbnails_outdated_when_settings_change(self):
+        """Новые настройки размеров требуют пересоздать копии"""
+        post = self.create_post_with_image()
+        self.assertFalse(thumbnails_outdated(post))
+        with self.settings(POST_IMAGE_WIDTHS=(320, 640)):
+            self.assertTrue(thumbnails_outdated(post))
+
+    def test_post_without_image_has_no_thumbnails(self):
+        """Посту без картинки миниатюры не нужны"""
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(text='Текст',
+                                       author=ThumbnailTest.user)
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnails, {})
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.base import Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import tracing
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+TRACING_PATH = os.path.join(tempfile.mkdtemp(), 'traces.jsonl')
+
+
+@override_settings(TRACING_SAMPLE_RATE=1, TRACING_PATH=TRACING_PATH)
+class TracingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        Comment.objects.create(post=cls.post, author=cls.author,
+                               text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        if os.path.exists(TRACING_PATH):
+            os.remove(TRACING_PATH)
+        self.url = reverse('posts:post', kwargs={
+            'username': 'author', 'post_id': TracingTest.post.pk
+        })
+
+    def read_spans(self):
+        with open(TRACING_PATH, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_post_view_is_broken_down_into_spans(self):
+        """Запрос раскладывается на вложенные span'ы SQL и шаблонов"""
+        self.client.get(self.url)
+        spans = self.read_spans()
+        root = spans[0]
+        self.assertEqual(root['name'], 'posts:post')
+        self.assertIsNone(root['parent_id'])
+        self.assertEqual(root['attrs']['status'], 200)
+        self.assertEqual({span['trace_id'] for span in spans},
+                         {root['trace_id']})
+
+        by_id = {span['span_id']: span for span in spans}
+        kinds = {span['kind'] for span in spans}
+        self.assertEqual(kinds, {'view', 'db', 'template', 'cache'})
+        templates = {span['attrs'].get('template') for span in spans
+                     if span['kind'] == 'template'}
+        self.assertIn('posts/post_view.html', templates)
+        self.assertIn('comments.html', templates)
+        for span in spans[1:]:
+            parent = by_id[span['parent_id']]
+            self.assertGreaterEqual(span['start'], parent['start'])
+            self.assertLessEqual(span['duration_ms'], root['duration_ms'])
+        comments = next(span for span in spans
+                        if span['attrs'].get('template') == 'comments.html')
+        self.assertEqual(by_id[comments['parent_id']]['attrs']['template'],
+                         'posts/post_view.html')
+
+    def test_cache_calls_are_traced(self):
+        """Кеш карточек виден внутри шаблона карточки"""
+        self.client.get(reverse('posts:index'))
+        spans = self.read_spans()
+        by_id = {span['span_id']: span for span in spans}
+        calls = [span for span in spans if span['kind'] == 'cache']
+        self.assertEqual([span['name'] for span in calls],
+                         ['cache.get', 'cache.set'])
+        self.assertEqual(by_id[calls[0]['parent_id']]['attrs']['template'],
+                         'posts/post_item.html')
+
+    def test_django_classes_are_not_patched(self):
+        """Повторный install() ничего не подменяет и не удваивает span'ы"""
+        render = Template.render
+        tracing.install()
+        tracing.install()
+        self.client.get(reverse('posts:index'))
+        self.assertIs(Template.render, render)
+        self.assertEqual(LocMemCache.get.__qualname__, 'LocMemCache.get')
+        calls = [span['name'] for span in self.read_spans()
+                 if span['kind'] == 'cache']
+        self.assertEqual(calls, ['cache.get', 'cache.set'])
+
+    def test_each_request_is_a_separate_trace(self):
+        """Каждый запрос пишется отдельной трассировкой"""
+        self.client.get(self.url)
+        self.client.get(reverse('posts:index'))
+        roots = [span for span in self.read_spans()
+                 if span['parent_id'] is None]
+        self.assertEqual([span['name'] for span in roots],
+                         ['posts:post', 'posts:index'])
+        self.assertNotEqual(roots[0]['trace_id'], roots[1]['trace_id'])
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_tracing_is_off_by_default(self):
+        """С нулевой долей ничего не записывается"""
+        self.client.get(self.url)
+        self.assertFalse(os.path.exists(TRACING_PATH))
@@ -1,15 +1,17 @@
+import base64
 import shutil
 import tempfile
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Paginator
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -84,6 +86,7 @@ class PostsViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.auth_client = Client()
         self.auth_client_alt = Client()
@@ -125,9 +128,63 @@ class PostsViewsTest(TestCase):
         возвращает оставшиеся 8 записи на второй странице
         """
         url = reverse('posts:index')
-        url += '?page=2'
+        first_page = self.auth_client.get(url).context.get('page')
+        url += f'?after={first_page.next_cursor}'
         response = self.auth_client.get(url)
-        self.assertEqual(len(response.context.get('page').object_list), 8)
+        page = response.context.get('page')
+        self.assertEqual(len(page.object_list), 8)
+        self.assertIsNone(page.next_cursor)
+        self.assertEqual(page.object_list[-1].text, 'Текст-1')
+
+    def test_paginator_cursor_goes_back_to_first_page(self):
+        """
+        Курсор ?before= возвращает предыдущую страницу целиком
+        """
+        url = reverse('posts:index')
+        first_page = self.auth_client.get(url).context.get('page')
+        second_page = self.auth_client.get(
+            f'{url}?after={first_page.next_cursor}'
+        ).context.get('page')
+        response = self.auth_client.get(
+            f'{url}?before={second_page.previous_cursor}'
+        )
+        page = response.context.get('page')
+        self.assertEqual(list(page.object_list), list(first_page.object_list))
+        self.assertIsNone(page.previous_cursor)
+
+    def test_paginator_broken_cursor_returns_first_page(self):
+        """
+        Испорченный курсор отдает первую страницу
+        """
+        response = self.auth_client.get(
+            reverse('posts:index') + '?after=broken'
+        )
+        page = response.context.get('page')
+        self.assertEqual(page.object_list[0].text, 'Текст-image')
+        self.assertIsNone(page.previous_cursor)
+
+    def test_paginator_out_of_range_cursor_returns_first_page(self):
+        """
+        Курсор с огромным id или датой с часовым поясом
+        отдает первую страницу, а не ошибку
+        """
+        post = Post.objects.get(text='Текст-1')
+        comments_url = reverse('posts:comments', kwargs={
+            'username': post.author.username, 'post_id': post.pk
+        })
+        for raw in ('2020-01-01T00:00:00|99999999999999999999999',
+                    '2020-01-01T00:00:00+05:00|1'):
+            token = base64.urlsafe_b64encode(raw.encode()).decode()
+            for url in (reverse('posts:index'), reverse('posts:api_index'),
+                        comments_url):
+                with self.subTest(raw=raw, url=url):
+                    response = self.auth_client.get(f'{url}?after={token}')
+                    self.assertEqual(response.status_code, 200)
+            page = self.auth_client.get(
+                f'{reverse("posts:index")}?after={token}'
+            ).context.get('page')
+            self.assertEqual(page.object_list[0].text, 'Текст-image')
+            self.assertIsNone(page.previous_cursor)
 
     def test_index_page_contains_context(self):
         """
@@ -226,15 +283,54 @@ class PostsViewsTest(TestCase):
         self.assertEqual(response.context.get('post').image,
                          'posts/small.gif')
 
-    def test_cache_index_page(self):
-        """Тестируем cache"""
-        index_one = self.client.get(reverse('posts:index'))
+    def test_new_post_appears_on_index_at_once(self):
+        """Новый пост виден на главной сразу, без ожидания кеша"""
+        self.client.get(reverse('posts:index'))
         Post.objects.create(
                 text='Test-cache',
                 author=PostsViewsTest.user
             )
-        index_two = self.client.get(reverse('posts:index'))
-        self.assertHTMLEqual(str(index_one.content), str(index_two.content))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Test-cache')
+
+    def test_post_card_cache_is_invalidated(self):
+        """Правка поста, комментарий и группа обновляют карточку"""
+        group = Group.objects.create(title='Старое название', slug='cards')
+        post = Post.objects.create(text='Было', author=PostsViewsTest.user,
+                                   group=group)
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), 'Было')
+
+        post.text = 'Стало'
+        post.save()
+        self.assertContains(self.client.get(url), 'Стало')
+
+        Comment.objects.create(post=post, author=PostsViewsTest.user1,
+                               text='Комментарий')
+        self.assertContains(self.client.get(url),
+                            '<div class="btn btn-sm">1</div>', html=True)
+
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.client.get(url), '#Новое название')
+
+        author = User.objects.create_user(username='old_name')
+        Post.objects.create(text='Пост автора', author=author)
+        self.assertContains(self.client.get(url), '@old_name')
+        author.username = 'new_name'
+        author.save()
+        response = self.client.get(url)
+        self.assertContains(response, '@new_name')
+        self.assertNotContains(response, '@old_name')
+
+    def test_post_card_is_cached(self):
+        """Повторный показ карточки берет ее из кеша"""
+        post = Post.objects.create(text='Кеш', author=PostsViewsTest.user)
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=post.pk).update(text='Мимо сигналов')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Кеш')
+        self.assertNotContains(response, 'Мимо сигналов')
 
     def test_authenticated_user_can_profile_follow_and_unfollow(self):
         """
@@ -295,7 +391,7 @@ class PostsViewsTest(TestCase):
 
         response = self.auth_client_alt.get(reverse('posts:follow_index'))
 
-        self.assertFalse(response.context.get('page').object_list.exists())
+        self.assertFalse(response.context.get('page').object_list)
 
     def test_auth_user_can_comment_on_posts(self):
         """Только авторизованный пользователь может комментирорвать посты"""
@@ -310,3 +406,29 @@ class PostsViewsTest(TestCase):
                     response,
                     f'/auth/login/?next={url}'
                 )
+
+    def test_post_view_shows_comments_in_chunks(self):
+        """Комментарии выводятся порциями, остальные подгружаются"""
+        post = Post.objects.create(text='Обсуждаемый',
+                                   author=PostsViewsTest.user)
+        for i in range(25):
+            Comment.objects.create(post=post, author=PostsViewsTest.user1,
+                                   text=f'Комментарий {i:02}')
+        kwargs = {'username': PostsViewsTest.user.username,
+                  'post_id': post.id}
+
+        response = self.client.get(reverse('posts:post', kwargs=kwargs))
+        comments = response.context['comment_page']
+        self.assertEqual([comment.text for comment in comments],
+                         [f'Комментарий {i:02}' for i in range(20)])
+        self.assertContains(response, 'js-more-comments')
+
+        response = self.client.get(
+            reverse('posts:comments', kwargs=kwargs),
+            {'after': comments.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/comment_list.html')
+        self.assertEqual([comment.text for comment in
+                          response.context['comment_page']],
+                         [f'Комментарий {i:02}' for i in range(20, 25)])
+        self.assertNotContains(response, 'js-more-comments')
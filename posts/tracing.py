@@ -0,0 +1,189 @@
+"""
+Выборочная трассировка запросов в локальный файл.
+
+TracingMiddleware открывает корневой span запроса, внутри него
+вложенными span'ами записываются SQL-запросы, рендер каждого шаблона
+(включая {% include %} и карточки post_cards) и обращения к кешу.
+В трассировку попадает доля TRACING_SAMPLE_RATE запросов, по
+завершении запроса все его span'ы дописываются в TRACING_PATH,
+по одному JSON-объекту на строку. При нулевой доле middleware
+отключается целиком и ничего не стоит.
+
+Классы Django и сторонних библиотек не подменяются: шаблоны пишут
+span'ы через движок TracedEngine, который подключает шаблонный бэкенд
+posts.metrics.MeteredTemplates, а кеш - через обертку
+posts.metrics.MeteredCache из CACHES.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from django.template.engine import Engine
+
+# Больше span'ов в одной трассировке не записывается.
+MAX_SPANS = 2000
+MAX_SQL_LENGTH = 1000
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+class Trace:
+
+    def __init__(self):
+        self.trace_id = os.urandom(8).hex()
+        self.spans = []
+        self.stack = []
+        self.dropped = 0
+
+    def start(self, name, kind, **attrs):
+        """Открывает span, вложенный в текущий. Возвращает его или None."""
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = {
+            'trace_id': self.trace_id,
+            'span_id': len(self.spans) + 1,
+            'parent_id': self.stack[-1]['span_id'] if self.stack else None,
+            'name': name,
+            'kind': kind,
+            'start': time.time(),
+            'attrs': attrs,
+            '_started': time.perf_counter(),
+        }
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def finish(self, span, **attrs):
+        if span is None:
+            return
+        span['duration_ms'] = round(
+            (time.perf_counter() - span.pop('_started')) * 1000, 3
+        )
+        span['attrs'].update(attrs)
+        self.stack.remove(span)
+
+    def dumps(self):
+        if self.dropped:
+            self.spans[0]['attrs']['dropped_spans'] = self.dropped
+        return ''.join(json.dumps(span, ensure_ascii=False, default=str)
+                       + '\n' for span in self.spans)
+
+
+def current():
+    """Трассировка запроса, который обслуживает поток, или None."""
+    return getattr(_local, 'trace', None)
+
+
+def write(trace):
+    data = trace.dumps()
+    with _write_lock, open(settings.TRACING_PATH, 'a',
+                           encoding='utf-8') as file:
+        file.write(data)
+
+
+class TracingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.TRACING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        if random.random() >= settings.TRACING_SAMPLE_RATE:
+            return self.get_response(request)
+        trace = _local.trace = Trace()
+        span = trace.start('request', 'view', method=request.method,
+                           path=request.path)
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.trace = None
+        match = request.resolver_match
+        span['name'] = match.view_name if match else 'unresolved'
+        trace.finish(span, status=response.status_code)
+        write(trace)
+        return response
+
+
+def traced_query(execute, sql, params, many, context):
+    trace = current()
+    if trace is None:
+        return execute(sql, params, many, context)
+    span = trace.start('sql', 'db', sql=sql[:MAX_SQL_LENGTH], many=many)
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.finish(span)
+
+
+def add_query_tracer(sender=None, connection=None, **kwargs):
+    if traced_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(traced_query)
+
+
+def call(name, kind, describe, func, *args, **kwargs):
+    """Вызывает func внутри span'а, если запрос трассируется."""
+    trace = current()
+    if trace is None:
+        return func(*args, **kwargs)
+    span = trace.start(name, kind, **describe(args))
+    try:
+        return func(*args, **kwargs)
+    finally:
+        trace.finish(span)
+
+
+def cache_key(args):
+    key = args[0] if args else None
+    if isinstance(key, (list, tuple, set, dict)):
+        return {'keys': len(key)}
+    return {'key': str(key)}
+
+
+class TracedTemplate(Template):
+
+    def render(self, context):
+        trace = current()
+        if trace is None:
+            return super().render(context)
+        span = trace.start('template', 'template', template=self.name)
+        try:
+            return super().render(context)
+        finally:
+            trace.finish(span)
+
+
+class TracedEngine(Engine):
+    """
+    Движок шаблонов, который отдает TracedTemplate. Через него же
+    загружаются {% include %} и карточки post_cards, поэтому их рендер
+    виден вложенными span'ами.
+    """
+
+    def from_string(self, template_code):
+        return TracedTemplate(template_code, engine=self)
+
+    def find_template(self, name, dirs=None, skip=None):
+        template, origin = super().find_template(name, dirs, skip)
+        # Загрузчики создают обычный Template, а у TracedTemplate нет
+        # своих полей, поэтому достаточно сменить класс экземпляра.
+        if type(template) is Template:
+            template.__class__ = TracedTemplate
+        return template, origin
+
+
+def install():
+    """Подключает трассировку SQL ко всем соединениям."""
+    connection_created.connect(add_query_tracer)
+    for conn in connections.all():
+        add_query_tracer(connection=conn)
@@ -1,42 +1,62 @@
+import json
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.views.decorators.http import require_POST
+
+from .authors import card_user, get_author_cards, get_author_or_404
+from .conditions import (conditional_page, group_validators, index_validators,
+                         post_validators, profile_validators)
+from .export import FORMATS as EXPORT_FORMATS
+from .export import export_chunks
+from .feeds import FollowFeedPaginator
+from .follows import MAX_BATCH, follow_authors, unfollow_authors
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .graph import get_graph
+from .models import Follow, Group, Post, User, UserStats
+from .paginators import CommentPaginator, CountedPaginator, CursorPaginator
+from .search import get_backend as get_search_backend
 
+COMMENTS_PER_PAGE = 20
+SUGGESTIONS_COUNT = 5
+MUTUALS_SHOWN = 3
 
+
+@conditional_page(index_validators)
 def index(request):
     """
     Главная страница сайта.
     Выводит по 10 постов на страницу.
-    в request.GET параметр 'page', передает номер страницы которую
-    нужно вывести паджинатору
+    в request.GET параметры 'after' и 'before' передают курсор страницы,
+    которую нужно вывести паджинатору
     """
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = CursorPaginator(post_list, 10).get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
 
     return render(
                 request,
                 'index.html',
                 {
                     'page': page,
-                    'paginator': paginator
+                    'paginator': page.paginator
                 }
             )
 
 
+@conditional_page(group_validators)
 def group_posts(request, slug):
     """
     Выводит по 10 постов на страницу относящиеся к выброной группе.
     """
     group = get_object_or_404(Group, slug=slug)
-    group_post_list = group.posts.all()
-    paginator = Paginator(group_post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group_post_list = group.posts.for_feed()
+    page = CursorPaginator(group_post_list, 10).get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
 
     return render(
                 request,
@@ -44,7 +64,7 @@ def group_posts(request, slug):
                 {
                     'group': group,
                     'page': page,
-                    'paginator': paginator
+                    'paginator': page.paginator
                 }
             )
 
@@ -52,44 +72,58 @@ def group_posts(request, slug):
 @login_required
 def follow_index(request):
     """
-    Выводит ленту постов подписок
+    Выводит ленту постов подписок.
+    Посты читаются из материализованной ленты пользователя,
+    см. posts.feeds.FollowFeedPaginator
     """
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = FollowFeedPaginator(request.user, 10).get_page(
+        request.GET.get('after'), request.GET.get('before')
+    )
+    suggested = get_graph().suggestions(request.user.pk, SUGGESTIONS_COUNT)
+    authors = User.objects.in_bulk(
+        [author_id for author_id, _ in suggested]
+    ) if suggested else {}
 
     return render(
                 request,
                 'follow.html',
                 {
                     'page': page,
-                    'paginator': paginator
+                    'paginator': page.paginator,
+                    'suggestions': [(authors[author_id], common)
+                                    for author_id, common in suggested
+                                    if author_id in authors]
                 }
             )
 
 
+@conditional_page(profile_validators)
 def profile(request, username):
     """
     Профайл пользователя.
     Выводит все посты созданные пользователем на портале
     с погинацией по 5 постов.
     """
-    author = get_object_or_404(User, username=username)
-    author_posts_list = author.posts.all()
-    paginator = Paginator(author_posts_list, 5)
+    # Странице нужны только поля карточки, поэтому строка автора
+    # не читается, а счетчики берутся из UserStats по id.
+    author = card_user(get_author_or_404(username))
+    author_posts_list = author.posts.for_feed()
+    counters = UserStats.for_user(author).as_counters()
+    paginator = CountedPaginator(author_posts_list, 5,
+                                 counters['post_count'])
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
-    counters = {
-        'follower_count': author.follower.count(),
-        'following_count': author.following.count(),
-        'post_count': paginator.count
-    }
     is_follow = False
-    if (request.user.is_authenticated
-        and Follow.objects.filter(user=request.user,
-                                  author=author).exists()):
-        is_follow = True
+    mutual_ids = []
+    if request.user.is_authenticated:
+        is_follow = Follow.objects.filter(user=request.user,
+                                          author=author).exists()
+        if request.user != author:
+            mutual_ids = get_graph().mutual_followers(request.user.pk,
+                                                      author.pk)
+    mutuals = list(User.objects.filter(
+        pk__in=mutual_ids[:MUTUALS_SHOWN]
+    ).order_by('pk')) if mutual_ids else []
 
     return render(
                 request,
@@ -97,14 +131,45 @@ def profile(request, username):
                 {
                     'page': page,
                     'author': author,
-                    'paginator': paginator,
+                    'paginator': page.paginator,
                     'counters': counters,
-                    'is_follow': is_follow
+                    'is_follow': is_follow,
+                    'mutuals': mutuals,
+                    'mutuals_more': len(mutual_ids) - len(mutuals)
+                }
+            )
+
+
+def search(request):
+    """
+    Поиск по тексту постов и комментариев.
+    Выводит по 10 постов на страницу в порядке релевантности,
+    номер страницы передается в параметре 'page'.
+    """
+    query = request.GET.get('q', '').strip()
+    page_number = request.GET.get('page', '1')
+    page_number = int(page_number) if page_number.isdigit() else 1
+    page_number = max(page_number, 1)
+    per_page = 10
+    post_ids = get_search_backend().search(
+        query, (page_number - 1) * per_page, per_page + 1
+    )
+    posts = Post.objects.for_feed().in_bulk(post_ids[:per_page])
+
+    return render(
+                request,
+                'search.html',
+                {
+                    'query': query,
+                    'posts': [posts[pk] for pk in post_ids if pk in posts],
+                    'page_number': page_number,
+                    'has_next': len(post_ids) > per_page
                 }
             )
 
 
 @login_required
+@transaction.atomic
 def new_post(request):
     """
     Функция создания новой записи в блог.
@@ -121,18 +186,22 @@ def new_post(request):
     return redirect('posts:index')
 
 
+@conditional_page(post_validators)
 def post_view(request, username, post_id):
     """
-    Страница просмотра отдельной записи
+    Страница просмотра отдельной записи.
+    Комментарии выводятся порциями по COMMENTS_PER_PAGE,
+    следующая порция подгружается через post_comments
     """
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats'),
+        pk=post_id, author_id=get_author_or_404(username).id
+    )
+    comment_page = CommentPaginator(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE
+    ).get_page(request.GET.get('after'))
     form = CommentForm()
-    counters = {
-        'follower_count': post.author.follower.count(),
-        'following_count': post.author.following.count(),
-        'post_count': post.author.posts.count()
-    }
+    counters = UserStats.for_user(post.author).as_counters()
     is_follow = False
 
     if (request.user.is_authenticated
@@ -147,13 +216,40 @@ def post_view(request, username, post_id):
                     'post': post,
                     'author': post.author,
                     'counters': counters,
-                    'comments': comments,
+                    # Исходный QuerySet комментариев, как object_list
+                    # у ListView: шаблон выводит comment_page, а сам
+                    # набор не вычисляется и запросов не добавляет.
+                    'comments': comment_page.paginator.object_list,
+                    'comment_page': comment_page,
                     'form': form,
                     'is_follow': is_follow
                 }
             )
 
 
+def post_comments(request, username, post_id):
+    """
+    HTML-фрагмент со следующей порцией комментариев к записи
+    для кнопки "Показать еще", курсор передается в параметре 'after'
+    """
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        pk=post_id, author_id=get_author_or_404(username).id
+    )
+    comment_page = CommentPaginator(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE
+    ).get_page(request.GET.get('after'))
+
+    return render(
+                request,
+                'posts/comment_list.html',
+                {
+                    'post': post,
+                    'comment_page': comment_page
+                }
+            )
+
+
 @login_required
 def post_edit(request, username, post_id):
     """
@@ -162,9 +258,10 @@ def post_edit(request, username, post_id):
     и позволяет редаактировать только свои посты.
     При успешно изменении записи возвращает на страницу просмотра поста
     """
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    post = get_object_or_404(Post, pk=post_id,
+                             author_id=get_author_or_404(username).id)
 
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post', username=username, post_id=post_id)
 
     form = PostForm(
@@ -200,7 +297,8 @@ def add_comment(request, username, post_id):
         После успешной отправки формы возвращает на страницу просмотра поста,
         так же вернет если форма не валидна или обратились через GET запрос
     """
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    post = get_object_or_404(Post, pk=post_id,
+                             author_id=get_author_or_404(username).id)
     form = CommentForm(request.POST or None)
     if not form.is_valid():
         return redirect('posts:post', username=username, post_id=post_id)
@@ -214,6 +312,7 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Подписаться на автора
 
@@ -223,20 +322,12 @@ def profile_follow(request, username):
     Returns:
         После успешного создания записи, возвращает в профайл пользователя
     """
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    if user == author or Follow.objects.filter(
-                                user=user, author=author).exists():
-        return redirect('posts:profile', username=username)
-
-    Follow.objects.create(
-        user=request.user,
-        author=author
-    )
+    follow_authors(request.user, [get_author_or_404(username).id])
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Удаляет подписку на автора
 
@@ -246,12 +337,85 @@ def profile_unfollow(request, username):
     Returns:
         Удаляет запись об авторе и возвращает в профайл
     """
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    Follow.objects.filter(user=user, author=author).delete()
+    unfollow_authors(request.user, [get_author_or_404(username).id])
     return redirect('posts:profile', username=username)
 
 
+@login_required
+@require_POST
+@transaction.atomic
+def follow_bulk(request):
+    """Подписка и отписка на нескольких авторов одним запросом
+
+    Принимает JSON {"follow": [имена], "unfollow": [имена]}
+    или форму с повторяющимися полями follow и unfollow.
+
+    Returns:
+        JSON с именами авторов, на которых подписка действительно
+        появилась или исчезла. Неизвестные имена пропускаются
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+            to_follow = data.get('follow', [])
+            to_unfollow = data.get('unfollow', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+        if not all(isinstance(names, list)
+                   and all(isinstance(name, str) for name in names)
+                   for names in (to_follow, to_unfollow)):
+            return JsonResponse(
+                {'error': 'follow и unfollow должны быть списками имен'},
+                status=400
+            )
+    else:
+        to_follow = request.POST.getlist('follow')
+        to_unfollow = request.POST.getlist('unfollow')
+    if len(to_follow) + len(to_unfollow) > MAX_BATCH:
+        return JsonResponse(
+            {'error': f'Не больше {MAX_BATCH} имен за запрос'}, status=400
+        )
+
+    ids = {username: card.id for username, card in get_author_cards(
+        to_follow + to_unfollow
+    ).items()}
+    names = {user_id: username for username, user_id in ids.items()}
+    followed = follow_authors(
+        request.user, [ids[name] for name in to_follow if name in ids]
+    )
+    unfollowed = unfollow_authors(
+        request.user, [ids[name] for name in to_unfollow if name in ids]
+    )
+    return JsonResponse({
+        'followed': [names[user_id] for user_id in followed],
+        'unfollowed': [names[user_id] for user_id in unfollowed]
+    })
+
+
+@login_required
+def export_posts(request, username):
+    """Выгрузка своих постов и комментариев
+
+    Формат задается параметром 'format': ndjson (по умолчанию),
+    csv или zip (NDJSON и картинки). Ответ отдается потоком,
+    выгружать можно только свои записи.
+    """
+    if request.user.username != username:
+        return redirect('posts:profile', username=username)
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'ndjson'
+    content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        export_chunks(request.user, export_format),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{username}-posts.{extension}"'
+    )
+    return response
+
+
 def page_not_found(request, exception):
     return render(
                 request,
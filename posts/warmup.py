@@ -0,0 +1,48 @@
+"""
+Прогрев шаблонов при старте процесса.
+
+С кеширующим загрузчиком шаблон читается с диска и компилируется
+при первом обращении к нему, то есть на первых запросах каждого
+процесса. warm_templates() компилирует заранее все шаблоны проекта
+(каталог templates/ и templates/ приложений внутри BASE_DIR),
+и первые запросы обслуживаются уже из кеша загрузчика.
+"""
+import os
+
+from django.conf import settings
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+
+
+def iter_template_names(engine):
+    """Имена всех .html-шаблонов проекта относительно их каталогов."""
+    base_dir = os.path.abspath(settings.BASE_DIR)
+    dirs = list(engine.dirs) + [
+        str(directory) for directory in get_app_template_dirs('templates')
+    ]
+    seen = set()
+    for directory in dirs:
+        directory = os.path.abspath(directory)
+        if not directory.startswith(base_dir):
+            continue
+        for root, _, files in os.walk(directory):
+            for filename in sorted(files):
+                if not filename.endswith('.html'):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename),
+                                       directory).replace(os.sep, '/')
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+
+def warm_templates(engine=None):
+    """
+    Компилирует шаблоны проекта и возвращает их число.
+    Ошибка синтаксиса в любом шаблоне прерывает старт процесса.
+    """
+    engine = engine or engines['django'].engine
+    names = list(iter_template_names(engine))
+    for name in names:
+        engine.get_template(name)
+    return len(names)
@@ -1,6 +1,9 @@
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 
+from posts.authors import is_reserved_username
+
 User = get_user_model()
 
 
@@ -14,3 +17,11 @@ class CreationForm(UserCreationForm):
             'username',
             'email'
         ]
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if is_reserved_username(username):
+            raise forms.ValidationError(
+                'Это имя занято адресом страницы сайта'
+            )
+        return username
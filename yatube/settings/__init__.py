@@ -0,0 +1,12 @@
+"""
+Настройки выбираются переменной окружения DJANGO_ENV:
+dev (по умолчанию) для разработки и тестов, prod для боевого сервера.
+Модуль окружения можно указать и напрямую:
+DJANGO_SETTINGS_MODULE=yatube.settings.prod.
+"""
+import os
+
+if os.environ.get('DJANGO_ENV', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
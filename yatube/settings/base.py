@@ -0,0 +1,215 @@
+"""
+Общие настройки. Окружение выбирается в yatube/settings/__init__.py,
+отличия для разработки и боевого сервера лежат в dev.py и prod.py.
+"""
+import os
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    '.local',
+    '127.0.0.1',
+    'testserver',
+    '*'
+    ]
+
+INSTALLED_APPS = [
+    'posts.apps.PostsConfig',
+    'users',
+    'about',
+    'sorl.thumbnail',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
+    'posts.tracing.TracingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'yatube.urls'
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Бэкенд шаблонов Django с замером времени рендера для метрик
+# (posts.metrics), имя движка прежнее.
+TEMPLATES = [
+    {
+        'BACKEND': 'posts.metrics.MeteredTemplates',
+        'NAME': 'django',
+        'DIRS': [TEMPLATES_DIR],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'yatube.wsgi.application'
+
+# Компилировать все шаблоны при старте WSGI-процесса (posts.warmup).
+# Имеет смысл только с кеширующим загрузчиком шаблонов.
+TEMPLATES_WARMUP = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': ('django.contrib.auth.password_validation.'
+                 'UserAttributeSimilarityValidator'),
+    },
+    {
+        'NAME': ('django.contrib.auth.password_validation.'
+                 'MinimumLengthValidator'),
+    },
+    {
+        'NAME': ('django.contrib.auth.password_validation.'
+                 'CommonPasswordValidator'),
+    },
+    {
+        'NAME': ('django.contrib.auth.password_validation.'
+                 'NumericPasswordValidator'),
+    },
+]
+
+LOGIN_URL = '/auth/login/'
+
+LOGIN_REDIRECT_URL = 'posts:index'
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = False
+
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+# posts.metrics.MeteredCache считает попадания в кеш для метрик
+# и передает вызовы бэкенду из OPTIONS['BACKEND'].
+CACHES = {
+    'default': {
+        'BACKEND': 'posts.metrics.MeteredCache',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+}
+
+# Авторы, у которых подписчиков не меньше этого числа, не раскладываются
+# по лентам при публикации, их посты подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 1000
+
+# Сколько последних постов автора попадает в ленту при подписке на него.
+FEED_BACKFILL_LIMIT = 1000
+
+# Граф подписок в памяти (posts/graph.py): предел числа ребер, после
+# которого граф не загружается (4 байта на id, два массива), и период
+# в секундах, через который он перечитывается из базы.
+FOLLOW_GRAPH_MAX_EDGES = 5000000
+FOLLOW_GRAPH_TTL = 600
+
+# Без брокера задачи Celery выполняются сразу в процессе веб-сервера.
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'memory://')
+CELERY_TASK_ALWAYS_EAGER = 'CELERY_BROKER_URL' not in os.environ
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Граф подписок перестраивается в фоновом потоке, запросы его не ждут.
+# Без брокера (разработка, тесты) он, как и задачи Celery, строится сразу.
+FOLLOW_GRAPH_BACKGROUND = not CELERY_TASK_ALWAYS_EAGER
+
+# Поисковый индекс в памяти (posts/search.py, не SQLite): период
+# в секундах, через который он перечитывается из базы, чтобы найти
+# записи других процессов, и перестройка в фоне, как у графа подписок.
+SEARCH_INDEX_TTL = 600
+SEARCH_INDEX_BACKGROUND = FOLLOW_GRAPH_BACKGROUND
+
+# Адаптивные копии картинок постов, которые готовит заранее задача
+# posts.tasks.generate_thumbnails: ширины, пропорции карточки и форматы
+# в порядке предпочтения. Форматы, которые не умеет сохранять Pillow,
+# пропускаются, JPEG делается всегда.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+
+# Адреса, с которых доступны метрики Prometheus (/admin/metrics/),
+# сотрудникам они доступны всегда.
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Трассировка (posts/tracing.py): доля запросов от 0 до 1, которые
+# записываются в TRACING_PATH. При 0 трассировка выключена.
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0))
+TRACING_PATH = os.environ.get(
+    'TRACING_PATH', os.path.join(BASE_DIR, 'traces.jsonl')
+)
+
+# Журнал медленных запросов (posts/slowlog.py): запросы дольше
+# SLOW_QUERY_MS миллисекунд с местом вызова и планом пишутся
+# в SLOW_QUERY_LOG. По умолчанию (None) журнал выключен, например
+# SLOW_QUERY_MS=200 включает его.
+SLOW_QUERY_MS = (float(os.environ['SLOW_QUERY_MS'])
+                 if os.environ.get('SLOW_QUERY_MS') else None)
+SLOW_QUERY_LOG = os.environ.get(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'posts.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,23 @@
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE
+
+SECRET_KEY = 'r$yg4rhc6_&w&pzynorpnqep*4a6l@w21w((@s%xde6h3xg7v)'
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + ['debug_toolbar']
+
+MIDDLEWARE = MIDDLEWARE + ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
+INTERNAL_IPS = [
+    '',
+]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'posts.metrics.MeteredCache',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+}
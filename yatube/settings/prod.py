@@ -0,0 +1,71 @@
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, DATABASES, TEMPLATES
+
+try:
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+except KeyError:
+    raise ImproperlyConfigured('Задайте переменную DJANGO_SECRET_KEY')
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
+    if host.strip()
+]
+
+# Соединение с базой живет между запросами, а не открывается на каждый.
+DATABASES = copy.deepcopy(DATABASES)
+DATABASES['default']['CONN_MAX_AGE'] = int(
+    os.environ.get('DJANGO_CONN_MAX_AGE', 600)
+)
+
+# Кеш общий для всех процессов сервера: Redis (нужен пакет django-redis),
+# если задан REDIS_URL, иначе файлы на диске. Бэкенд обернут
+# posts.metrics.MeteredCache, как и в base.py.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.metrics.MeteredCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'OPTIONS': {'BACKEND': 'django_redis.cache.RedisCache'},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'posts.metrics.MeteredCache',
+            'LOCATION': os.environ.get(
+                'DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+            ),
+            'OPTIONS': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Скомпилированные шаблоны хранятся в памяти процесса.
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.template.context_processors.debug'
+]
+
+# Все шаблоны компилируются при старте процесса, см. posts.warmup.
+TEMPLATES_WARMUP = True
@@ -4,10 +4,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from posts import metrics
+
 handler404 = 'posts.views.page_not_found' # noqa
 handler500 = 'posts.views.server_error' # noqa
 
 urlpatterns = [
+    # Под admin/, чтобы адрес не закрывал страницу пользователя.
+    path('admin/metrics/', metrics.metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls')),